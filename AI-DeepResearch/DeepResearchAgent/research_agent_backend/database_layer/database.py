@@ -137,9 +137,13 @@ class Database:
         return await loop.run_in_executor(None, self.handler.get_all_jobs, limit, offset)
 
     # --- Task Operations (Async Wrappers) ---
-    async def create_task(self, task_id: str, job_id: str, sequence_order: int, task_type: str, description: str, parameters: Optional[Dict[str, Any]]):
+    async def create_task(self, task_id: str, job_id: str, sequence_order: int, task_type: str, description: str, parameters: Optional[Union[str, Dict[str, Any]]]):
         loop = asyncio.get_running_loop()
-        await loop.run_in_executor(None, self.handler.create_task, task_id, job_id, sequence_order, task_type, description, parameters)
+        return await loop.run_in_executor(None, self.handler.create_task, task_id, job_id, sequence_order, task_type, description, parameters)
+
+    async def create_tasks_bulk(self, rows: List[tuple]):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.handler.create_tasks_bulk, rows)
 
     async def update_task_status(self, task_id: str, status: str, error_message: Optional[str] = None):
         loop = asyncio.get_running_loop()
@@ -165,7 +169,27 @@ class Database:
         loop = asyncio.get_running_loop()
         return await loop.run_in_executor(None, self.handler.get_completed_tasks_by_type, job_id, task_type)
 
+    async def get_completed_tasks(self, job_id: str):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.handler.get_completed_tasks, job_id)
+
     async def count_tasks_by_status(self, job_id: str, status: str):
         loop = asyncio.get_running_loop()
         return await loop.run_in_executor(None, self.handler.count_tasks_by_status, job_id, status)
 
+    async def get_status_counts(self, job_id: str):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.handler.get_status_counts, job_id)
+
+    async def count_unfinished_tasks(self, job_id: str):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.handler.count_unfinished_tasks, job_id)
+
+    async def get_last_completed_task_by_type(self, job_id: str, task_type: str):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.handler.get_last_completed_task_by_type, job_id, task_type)
+
+    async def get_task_job_id(self, task_id: str):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.handler.get_task_job_id, task_id)
+
@@ -28,6 +28,8 @@ CREATE TABLE IF NOT EXISTS tasks (
 -- Indexes for faster lookups
 CREATE INDEX IF NOT EXISTS idx_tasks_job_status ON tasks (job_id, status);
 CREATE INDEX IF NOT EXISTS idx_tasks_job_sequence ON tasks (job_id, sequence_order);
+-- Covers "completed/pending tasks for a job in sequence order" without a sort step
+CREATE INDEX IF NOT EXISTS idx_tasks_job_status_sequence ON tasks (job_id, status, sequence_order);
 
 -- Trigger to update 'updated_at' timestamp on jobs table update
 -- can add later based on requirment
@@ -1,9 +1,8 @@
 import os
 import json
+import orjson
 import sqlite3
-import uuid
 from typing import Dict, Optional, Any, List, Union
-import aiosqlite
 import threading
 import logging
 from datetime import datetime, timezone
@@ -12,10 +11,35 @@ from database_layer.base_db_handler import BaseDBHandler
 
 logger = logging.getLogger(__name__)
 
+# orjson is several times faster than json for the parameters/result blobs written and read on
+# every task transition. Values are still stored as TEXT so existing databases keep working.
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+def _dumps(value: Any) -> str:
+    return orjson.dumps(value, option=_ORJSON_OPTIONS).decode("utf-8")
+
+def _decode_task_row(task_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """Deserializes the JSON `parameters`/`result` columns of a task row in place."""
+    for field in ('parameters', 'result'):
+        if task_dict.get(field):
+            try:
+                task_dict[field] = orjson.loads(task_dict[field])
+            except orjson.JSONDecodeError:
+                # Rows written by json.dumps may hold NaN/Infinity, which orjson rejects but json accepts
+                try:
+                    task_dict[field] = json.loads(task_dict[field])
+                except ValueError:
+                    logger.warning(f"Could not decode {field} JSON for task {task_dict.get('task_id')}: {task_dict.get(field)}")
+                    task_dict[field] = None
+            except TypeError:
+                logger.warning(f"Could not decode {field} JSON for task {task_dict.get('task_id')}: {task_dict.get(field)}")
+                task_dict[field] = None
+    return task_dict
+
 class SqliteHandler():
     """
     SQLite implementation of the database handler interface.
-    Uses aiosqlite for async database operations.
+    Uses blocking sqlite3 calls; Database runs them in the threadpool.
     """
     
     _local = threading.local()  # Thread-local storage for connection
@@ -38,7 +62,6 @@ class SqliteHandler():
         # Ensure the directory exists
         os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
         
-        self.connection = None
         logger.info(f"SQLiteHandler initialized with db_path: {self.db_path}")
     
     def _get_conn(self) -> sqlite3.Connection:
@@ -122,258 +145,6 @@ class SqliteHandler():
             conn.rollback()
             raise
 
-    async def connect(self) -> None:
-        """Establish a connection to the SQLite database."""
-        self.connection = await aiosqlite.connect(self.db_path)
-        # Enable foreign keys
-        await self.connection.execute("PRAGMA foreign_keys = ON")
-        # Use Row factory to get column names in results
-        self.connection.row_factory = aiosqlite.Row
-    
-    async def disconnect(self) -> None:
-        """Close the SQLite database connection."""
-        if self.connection:
-            await self.connection.close()
-            self.connection = None
-    
-    async def initialize_schema(self) -> None:
-        logger.info("****** this is being called, something is wrong here")
-        """Initialize the database schema (create tables if they don't exist)."""
-        if not self.connection:
-            await self.connect()
-            
-        # Create jobs table
-        await self.connection.execute("""
-        CREATE TABLE IF NOT EXISTS jobs (
-            id TEXT PRIMARY KEY,
-            user_query TEXT NOT NULL,
-            status TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            report_path TEXT
-        )
-        """)
-        
-        # Create tasks table
-        await self.connection.execute("""
-        CREATE TABLE IF NOT EXISTS tasks (
-            id TEXT PRIMARY KEY,
-            job_id TEXT NOT NULL,
-            task_type TEXT NOT NULL,
-            description TEXT NOT NULL,
-            parameters TEXT,  -- JSON serialized parameters
-            status TEXT NOT NULL,
-            result TEXT,  -- JSON serialized result
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (job_id) REFERENCES jobs(id) ON DELETE CASCADE
-        )
-        """)
-        
-        # Create users table for authentication
-        await self.connection.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id TEXT PRIMARY KEY,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
-        
-        await self.connection.commit()
-    
-    async def get_job_by_id(self, job_id: str) -> Optional[Dict[str, Any]]:
-        """Retrieve a job by its ID."""
-        if not self.connection:
-            await self.connect()
-            
-        async with self.connection.execute(
-            "SELECT * FROM jobs WHERE id = ?", (job_id,)
-        ) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                return dict(row)
-            return None
-    
-    async def create_job(self, job_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Create a new job in the database."""
-        if not self.connection:
-            await self.connect()
-            
-        # Generate a UUID if not provided
-        if 'id' not in job_data:
-            job_data['id'] = str(uuid.uuid4())
-            
-        # Set default status if not provided
-        if 'status' not in job_data:
-            job_data['status'] = 'PENDING'
-            
-        # Extract fields
-        job_id = job_data['id']
-        user_query = job_data['user_query']
-        status = job_data['status']
-        report_path = job_data.get('report_path')
-        
-        # Insert the job
-        await self.connection.execute(
-            """
-            INSERT INTO jobs (job_id, user_query, status, report_path)
-            VALUES (?, ?, ?, ?)
-            """,
-            (job_id, user_query, status, report_path)
-        )
-        await self.connection.commit()
-        
-        # Return the created job
-        return await self.get_job_by_id(job_id)
-    
-    async def update_job_status(self, job_id: str, status: str, detail: Optional[str] = None) -> bool:
-        """Update the status of a job and optionally set error message."""
-        if not self.connection:
-            await self.connect()
-            
-        try:
-            if detail:
-                await self.connection.execute(
-                    """
-                    UPDATE jobs 
-                    SET status = ?, error_message = ?, updated_at = CURRENT_TIMESTAMP
-                    WHERE job_id = ?
-                    """,
-                    (status, detail, job_id)
-                )
-            else:
-                await self.connection.execute(
-                    """
-                    UPDATE jobs 
-                    SET status = ?, updated_at = CURRENT_TIMESTAMP
-                    WHERE job_id = ?
-                    """,
-                    (status, job_id)
-                )
-            await self.connection.commit()
-            return True
-        except Exception as e:
-            logger.error(f"Failed to update job status: {e}")
-            return False
-    
-    async def get_task_by_id(self, task_id: str) -> Optional[Dict[str, Any]]:
-        """Retrieve a task by its ID."""
-        if not self.connection:
-            await self.connect()
-            
-        async with self.connection.execute(
-            "SELECT * FROM tasks WHERE id = ?", (task_id,)
-        ) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                task_dict = dict(row)
-                # Parse JSON fields
-                if task_dict.get('parameters'):
-                    task_dict['parameters'] = json.loads(task_dict['parameters'])
-                if task_dict.get('result'):
-                    task_dict['result'] = json.loads(task_dict['result'])
-                return task_dict
-            return None
-    
-    async def create_task(self, task_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Create a new task in the database."""
-        if not self.connection:
-            await self.connect()
-            
-        # Generate a UUID if not provided
-        if 'id' not in task_data:
-            task_data['id'] = str(uuid.uuid4())
-            
-        # Set default status if not provided
-        if 'status' not in task_data:
-            task_data['status'] = 'PENDING'
-            
-        # Extract fields
-        task_id = task_data['id']
-        job_id = task_data['job_id']
-        task_type = task_data['task_type']
-        description = task_data['description']
-        status = task_data['status']
-        
-        # Serialize JSON fields
-        parameters = task_data.get('parameters')
-        if parameters:
-            parameters = json.dumps(parameters)
-            
-        result = task_data.get('result')
-        if result:
-            result = json.dumps(result)
-        
-        # Insert the task
-        await self.connection.execute(
-            """
-            INSERT INTO tasks (id, job_id, task_type, description, parameters, status, result)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            (task_id, job_id, task_type, description, parameters, status, result)
-        )
-        await self.connection.commit()
-        
-        # Return the created task
-        return await self.get_task_by_id(task_id)
-    
-    async def update_task_status(self, task_id: str, status: str, result: Optional[Any] = None) -> bool:
-        """Update the status and optionally the result of a task."""
-        if not self.connection:
-            await self.connect()
-            
-        try:
-            # Serialize result if provided
-            result_json = None
-            if result is not None:
-                result_json = json.dumps(result)
-                
-            if result_json:
-                await self.connection.execute(
-                    """
-                    UPDATE tasks 
-                    SET status = ?, result = ?, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                    """,
-                    (status, result_json, task_id)
-                )
-            else:
-                await self.connection.execute(
-                    """
-                    UPDATE tasks 
-                    SET status = ?, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                    """,
-                    (status, task_id)
-                )
-                
-            await self.connection.commit()
-            return True
-        except Exception:
-            return False
-    
-    async def get_tasks_by_job_id(self, job_id: str) -> List[Dict[str, Any]]:
-        """Retrieve all tasks associated with a job."""
-        if not self.connection:
-            await self.connect()
-            
-        tasks = []
-        async with self.connection.execute(
-            "SELECT * FROM tasks WHERE job_id = ? ORDER BY created_at ASC", (job_id,)
-        ) as cursor:
-            async for row in cursor:
-                task_dict = dict(row)
-                # Parse JSON fields
-                if task_dict.get('parameters'):
-                    task_dict['parameters'] = json.loads(task_dict['parameters'])
-                if task_dict.get('result'):
-                    task_dict['result'] = json.loads(task_dict['result'])
-                tasks.append(task_dict)
-                
-        return tasks 
-
     # --- Job Operations ---
 
     def create_job(self, id: str, user_query: str) -> None:
@@ -425,17 +196,46 @@ class SqliteHandler():
 
     # --- Task Operations ---
 
-    def create_task(self, task_id: str, job_id: str, sequence_order: int, task_type: str, description: str, parameters: Optional[Dict[str, Any]]) -> None:
-        """Creates a new task record associated with a job."""
+    def create_task(self, task_id: str, job_id: str, sequence_order: int, task_type: str, description: str, parameters: Optional[Union[str, Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """
+        Creates a new task record associated with a job and returns the stored row (INSERT ... RETURNING),
+        so callers get DB-authoritative values without a follow-up SELECT. `parameters` may already be a JSON string.
+        """
         now = datetime.now(timezone.utc).isoformat()
-        params_json = json.dumps(parameters) if parameters else None
+        if isinstance(parameters, str):
+            params_json = parameters # Already serialized by the caller (Task.parameters_json)
+        else:
+            params_json = _dumps(parameters) if parameters else None
         query = """
             INSERT INTO tasks (task_id, job_id, sequence_order, task_type, description, parameters, status, created_at, updated_at)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            RETURNING *
         """
         params = (task_id, job_id, sequence_order, task_type, description, params_json, "PENDING", now, now)
-        self.execute_query(query, params, commit=True)
+        cursor = self.execute_query(query, params)
+        row = cursor.fetchone() # RETURNING rows must be read before the commit
+        self._get_conn().commit()
         logger.info(f"Created new task {task_id} for job {job_id}")
+        return _decode_task_row(dict(row)) if row else None
+
+    def create_tasks_bulk(self, rows: List[tuple]) -> None:
+        """
+        Inserts many task records in a single executemany + one commit (one transaction).
+        Each row is (task_id, job_id, sequence_order, task_type, description, params_json, status, created_at, updated_at).
+        """
+        query = """
+            INSERT INTO tasks (task_id, job_id, sequence_order, task_type, description, parameters, status, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """
+        conn = self._get_conn()
+        try:
+            conn.executemany(query, rows)
+            conn.commit()
+            logger.info(f"Created {len(rows)} tasks in one batch")
+        except sqlite3.Error as e:
+            logger.error(f"Database error bulk-inserting {len(rows)} tasks: {e}", exc_info=True)
+            conn.rollback()
+            raise
 
     def update_task_status(self, task_id: str, status: str, error_message: Optional[str] = None) -> None:
         """Updates the status and error message of a task."""
@@ -452,7 +252,7 @@ class SqliteHandler():
     def update_task_result(self, task_id: str, result: Any) -> None:
         """Updates the result of a completed task."""
         now = datetime.now(timezone.utc).isoformat()
-        result_json = json.dumps(result) # Ensure result is serializable
+        result_json = _dumps(result) # Ensure result is serializable
         query = """
             UPDATE tasks
             SET result = ?, updated_at = ?
@@ -467,47 +267,14 @@ class SqliteHandler():
         query = "SELECT * FROM tasks WHERE task_id = ?"
         row = self.fetch_one(query, (task_id,))
         if row:
-            task_dict = dict(row)
-            # Deserialize JSON fields
-            if task_dict.get('parameters'):
-                try:
-                    task_dict['parameters'] = json.loads(task_dict['parameters'])
-                except (json.JSONDecodeError, TypeError):
-                    logger.warning(f"Could not decode parameters JSON for task {task_id}: {task_dict.get('parameters')}")
-                    task_dict['parameters'] = None # Or handle as error
-            if task_dict.get('result'):
-                try:
-                    task_dict['result'] = json.loads(task_dict['result'])
-                except (json.JSONDecodeError, TypeError):
-                    logger.warning(f"Could not decode result JSON for task {task_id}: {task_dict.get('result')}")
-                    task_dict['result'] = None # Or handle as error
-            return task_dict
+            return _decode_task_row(dict(row))
         return None
 
     def get_tasks_by_job_id(self, job_id: str) -> List[Dict[str, Any]]:
         """Retrieves all tasks for a given job ID, ordered by sequence."""
         query = "SELECT * FROM tasks WHERE job_id = ? ORDER BY sequence_order ASC"
         rows = self.fetch_all(query, (job_id,))
-        tasks = []
-        for row in rows:
-            task_dict = dict(row)
-            # Deserialize JSON fields
-            if task_dict.get('parameters'):
-                 try:
-                    task_dict['parameters'] = json.loads(task_dict['parameters'])
-                 except (json.JSONDecodeError, TypeError):
-                    logger.warning(f"Could not decode parameters JSON for task {task_dict['task_id']}: {task_dict.get('parameters')}")
-                    task_dict['parameters'] = None
-            # Result is often large, maybe don't load/deserialize it here unless needed?
-            # Let's deserialize for now for consistency, optimize later if needed.
-            if task_dict.get('result'):
-                try:
-                    task_dict['result'] = json.loads(task_dict['result'])
-                except (json.JSONDecodeError, TypeError):
-                    logger.warning(f"Could not decode result JSON for task {task_dict['task_id']}: {task_dict.get('result')}")
-                    task_dict['result'] = None
-            tasks.append(task_dict)
-        return tasks
+        return [_decode_task_row(dict(row)) for row in rows]
 
     def get_next_pending_task(self, job_id: str) -> Optional[Dict[str, Any]]:
         """Retrieves the next PENDING task for a job, ordered by sequence."""
@@ -519,16 +286,7 @@ class SqliteHandler():
         """
         row = self.fetch_one(query, (job_id,))
         if row:
-            task_dict = dict(row)
-            # Deserialize JSON fields
-            if task_dict.get('parameters'):
-                 try:
-                    task_dict['parameters'] = json.loads(task_dict['parameters'])
-                 except (json.JSONDecodeError, TypeError):
-                    logger.warning(f"Could not decode parameters JSON for task {task_dict['task_id']}: {task_dict.get('parameters')}")
-                    task_dict['parameters'] = None
-            # Result should be null for pending tasks
-            return task_dict
+            return _decode_task_row(dict(row)) # Result is null for pending tasks
         return None
 
     def get_completed_tasks_by_type(self, job_id: str, task_type: str) -> List[Dict[str, Any]]:
@@ -539,25 +297,17 @@ class SqliteHandler():
             ORDER BY sequence_order ASC
         """
         rows = self.fetch_all(query, (job_id, task_type))
-        tasks = []
-        for row in rows:
-            task_dict = dict(row)
-            # Deserialize JSON fields
-            if task_dict.get('parameters'):
-                 try:
-                    task_dict['parameters'] = json.loads(task_dict['parameters'])
-                 except (json.JSONDecodeError, TypeError):
-                     logger.warning(f"Could not decode parameters JSON for task {task_dict['task_id']}: {task_dict.get('parameters')}")
-                     task_dict['parameters'] = None
-            if task_dict.get('result'):
-                try:
-                    task_dict['result'] = json.loads(task_dict['result'])
-                except (json.JSONDecodeError, TypeError):
-                    logger.warning(f"Could not decode result JSON for task {task_dict['task_id']}: {task_dict.get('result')}")
-                    task_dict['result'] = None
-            tasks.append(task_dict)
-        return tasks
+        return [_decode_task_row(dict(row)) for row in rows]
 
+    def get_completed_tasks(self, job_id: str) -> List[Dict[str, Any]]:
+        """Retrieves all completed tasks for a job (any type), filtered in SQL rather than in Python."""
+        query = """
+            SELECT * FROM tasks
+            WHERE job_id = ? AND status = 'COMPLETED'
+            ORDER BY sequence_order ASC
+        """
+        rows = self.fetch_all(query, (job_id,))
+        return [_decode_task_row(dict(row)) for row in rows]
 
     def count_tasks_by_status(self, job_id: str, status: str) -> int:
         """Counts the number of tasks for a job with a specific status."""
@@ -565,5 +315,36 @@ class SqliteHandler():
         result = self.fetch_one(query, (job_id, status))
         return result[0] if result else 0
 
+    def get_status_counts(self, job_id: str) -> Dict[str, int]:
+        """Returns a status -> task count histogram for a job in one GROUP BY query."""
+        rows = self.fetch_all("SELECT status, COUNT(*) FROM tasks WHERE job_id = ? GROUP BY status", (job_id,))
+        return {row[0]: row[1] for row in rows}
+
+    def count_unfinished_tasks(self, job_id: str) -> tuple:
+        """Returns (total, unfinished) task counts for a job in one aggregate query."""
+        query = """
+            SELECT COUNT(*), SUM(CASE WHEN status NOT IN ('COMPLETED', 'ERROR', 'SKIPPED') THEN 1 ELSE 0 END)
+            FROM tasks WHERE job_id = ?
+        """
+        result = self.fetch_one(query, (job_id,))
+        if not result:
+            return 0, 0
+        return result[0], result[1] or 0
+
+    def get_last_completed_task_by_type(self, job_id: str, task_type: str) -> Optional[Dict[str, Any]]:
+        """Retrieves the highest-sequence completed task of a given type for a job."""
+        query = """
+            SELECT * FROM tasks
+            WHERE job_id = ? AND task_type = ? AND status = 'COMPLETED'
+            ORDER BY sequence_order DESC
+            LIMIT 1
+        """
+        row = self.fetch_one(query, (job_id, task_type))
+        return _decode_task_row(dict(row)) if row else None
+
+    def get_task_job_id(self, task_id: str) -> Optional[str]:
+        """Looks up only the job_id of a task."""
+        row = self.fetch_one("SELECT job_id FROM tasks WHERE task_id = ?", (task_id,))
+        return row[0] if row else None
+
     # Potentially add cleanup methods, e.g., delete old jobs/tasks
-# // ... existing code ... (rest of the file remains the same for now) 
\ No newline at end of file
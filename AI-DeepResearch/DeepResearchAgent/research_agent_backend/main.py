@@ -83,6 +83,7 @@ async def lifespan(app: FastAPI):
             logger.info("Database connection closed.")
         # Websocket manager might have cleanup if needed (e.g., closing all connections)
         if websocket_manager_instance:
+             await websocket_manager_instance.flush_updates() # Don't drop coalesced status updates
              # await websocket_manager_instance.close_all_connections() # If such method exists
              logger.info("WebSocketManager resources released (if any).")
         logger.info("Application shutdown complete.")
@@ -813,7 +814,9 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
         await websocket.close(code=1011) # Internal error
         return
 
-    await websocket_manager_instance.connect(websocket, client_id)
+    # Clients that can decode binary frames (?binary=1) receive the shared orjson bytes as-is
+    binary_frames = websocket.query_params.get("binary") == "1"
+    await websocket_manager_instance.connect(websocket, client_id, binary_frames=binary_frames)
     logger.info(f"Client {client_id} connected via WebSocket.")
     try:
         while True:
@@ -1,5 +1,7 @@
 import uuid
+import orjson
 from enum import Enum
+from functools import cached_property
 from typing import List, Optional, Any, Dict, Union
 from pydantic import BaseModel, Field
 from datetime import datetime, timezone
@@ -33,6 +35,12 @@ class Task(BaseModel):
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
     updated_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
 
+    @cached_property
+    def parameters_json(self) -> Optional[str]:
+        """Compact JSON string of `parameters`, encoded once per task and reused when persisting.
+        Parameters are set at creation and not mutated afterwards, so the cache never goes stale."""
+        return orjson.dumps(self.parameters, option=orjson.OPT_NON_STR_KEYS).decode("utf-8") if self.parameters else None
+
     # Optional: Add validator if needed to ensure parameters/result are JSON serializable
     # @validator('parameters', 'result', pre=True, always=True)
     # def ensure_serializable(cls, v):
@@ -103,6 +111,12 @@ class WebSocketMessage(BaseModel):
     type: str
     payload: Dict[str, Any]
 
+    @classmethod
+    def message_dict(cls, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Builds the wire dict directly, skipping model validation and .dict() on the per-task hot path.
+        Only use with payloads we built ourselves (e.g. Task.model_dump())."""
+        return {"type": cls.model_fields["type"].default, "payload": payload}
+
 class TaskSuccessMessage(WebSocketMessage):
     type: str = "task_success"
     payload: Task # Send the completed task object
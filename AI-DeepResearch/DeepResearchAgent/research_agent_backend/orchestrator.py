@@ -94,7 +94,7 @@ class Orchestrator:
 
             # 2. Generate Plan (list of TaskInputData)
             await self.websocket_manager.send_personal_json(
-                JobProgressMessage(payload={"job_id": job_id, "message": "Generating research plan..."}).dict(),
+                JobProgressMessage.message_dict({"job_id": job_id, "message": "Generating research plan..."}),
                 client_id
             )
             planned_tasks_data: List[TaskInputData] = await self.planning_agent.generate_plan(user_query, job_id)
@@ -113,28 +113,26 @@ class Orchestrator:
 
             # 3. Add Planned Tasks to TaskManager (and thus Database)
             created_tasks: List[Task] = []
-            for i, task_input_dict in enumerate(planned_tasks_data):
-                try:
-                    # Convert the dictionary to a TaskInputData object
-                    task_input = TaskInputData(**task_input_dict)
-                    task = await self.task_manager.add_task(
-                        job_id=job_id,
-                        sequence_order=i + 1, # 1-indexed sequence
-                        task_input=task_input
-                    )
-                    created_tasks.append(task)
-                except Exception as e:
-                    logger.error(f"Job {job_id}: Failed to add planned task {task_input_dict} to DB: {e}", exc_info=True)
-                    # If one task fails to be added, we might fail the whole job startup
-                    await self.db.update_job_status(job_id, JobStatus.FAILED.value, f"Failed to add task {task_input.description} to database.")
-                    await self.websocket_manager.send_personal_json(
-                        JobFailedMessage(payload={
-                            "job_id": job_id,
-                            "error": f"Failed to initialize task: {task_input.description}"
-                        }).dict(),
-                        client_id
-                    )
-                    return job_id, [] # Return empty list as job setup failed
+            try:
+                # Convert the dictionaries to TaskInputData objects and insert the whole plan in one DB call
+                task_inputs = [TaskInputData(**task_input_dict) for task_input_dict in planned_tasks_data]
+                created_tasks = await self.task_manager.add_tasks(
+                    job_id=job_id,
+                    task_inputs=task_inputs,
+                    start_sequence=1 # 1-indexed sequence
+                )
+            except Exception as e:
+                logger.error(f"Job {job_id}: Failed to add planned tasks {planned_tasks_data} to DB: {e}", exc_info=True)
+                # If the plan can't be stored, fail the whole job startup
+                await self.db.update_job_status(job_id, JobStatus.FAILED.value, "Failed to add planned tasks to database.")
+                await self.websocket_manager.send_personal_json(
+                    JobFailedMessage(payload={
+                        "job_id": job_id,
+                        "error": "Failed to initialize the research plan tasks."
+                    }).dict(),
+                    client_id
+                )
+                return job_id, [] # Return empty list as job setup failed
             
             logger.info(f"Job {job_id}: Successfully added {len(created_tasks)} planned tasks to the database.")
 
@@ -144,7 +142,7 @@ class Orchestrator:
             self.pause_events[job_id] = asyncio.Event() # Initially unset
 
             await self.websocket_manager.send_personal_json(
-                JobProgressMessage(payload={"job_id": job_id, "message": "Research plan generated. Starting execution..."}).dict(),
+                JobProgressMessage.message_dict({"job_id": job_id, "message": "Research plan generated. Starting execution..."}),
                 client_id
             )
             return job_id, created_tasks # Return the Pydantic Task models
@@ -171,7 +169,7 @@ class Orchestrator:
         try:
             logger.info(f"Job {job_id}: Starting research flow.")
             await self.websocket_manager.send_personal_json(
-                JobProgressMessage(payload={"job_id": job_id, "message": "Research in progress..."}).dict(), client_id)
+                JobProgressMessage.message_dict({"job_id": job_id, "message": "Research in progress..."}), client_id)
 
             # Track the current phase of research to broadcast appropriate high-level messages
             search_phase_started = False
@@ -203,24 +201,24 @@ class Orchestrator:
                 # --- Broadcast Phase Updates ---
                 if next_task.task_type == TaskType.SEARCH and not search_phase_started:
                     await self.websocket_manager.send_personal_json(
-                        JobProgressMessage(payload={"job_id": job_id, "message": "Researching sources..."}).dict(), client_id)
+                        JobProgressMessage.message_dict({"job_id": job_id, "message": "Researching sources..."}), client_id)
                     search_phase_started = True
                 elif next_task.task_type == TaskType.FILTER and not filter_phase_started:
                     await self.websocket_manager.send_personal_json(
-                        JobProgressMessage(payload={"job_id": job_id, "message": "Consolidating information..."}).dict(), client_id)
+                        JobProgressMessage.message_dict({"job_id": job_id, "message": "Consolidating information..."}), client_id)
                     filter_phase_started = True
                 elif (next_task.task_type == TaskType.SYNTHESIZE or next_task.task_type == TaskType.REASON) and not analysis_phase_started:
                     await self.websocket_manager.send_personal_json(
-                        JobProgressMessage(payload={"job_id": job_id, "message": "Analyzing and synthesizing..."}).dict(), client_id)
+                        JobProgressMessage.message_dict({"job_id": job_id, "message": "Analyzing and synthesizing..."}), client_id)
                     analysis_phase_started = True
 
                 await self.task_manager.update_task_status(next_task.task_id, TaskStatus.RUNNING)
                 logger.info(f"Job {job_id}: Executing task {next_task.task_id} ({next_task.task_type.value}: {next_task.description})")
                 await self.websocket_manager.send_personal_json(
-                    JobProgressMessage(payload={
+                    JobProgressMessage.message_dict({
                         "job_id": job_id,
                         "message": f"Executing task: {next_task.task_type.value} - {next_task.description}"
-                    }).dict(), client_id)
+                    }), client_id)
                 
                 try:
                     agent_function = self.agent_dispatch.get(next_task.task_type)
@@ -255,9 +253,9 @@ class Orchestrator:
                         if completed_task_model:
                             # Make sure we're sending a proper WebSocketMessage format
                             logger.info(f"Job {job_id}: Sending task success message for task {next_task.task_id}")
-                            success_message = TaskSuccessMessage(payload=completed_task_model)
+                            success_message = TaskSuccessMessage.message_dict(completed_task_model.model_dump())
                             await self.websocket_manager.send_personal_json(
-                                success_message.dict(), client_id
+                                success_message, client_id
                             )
                         logger.info(f"Job {job_id}: Task {next_task.task_id} ({next_task.task_type.value}) completed.")
                     elif next_task.task_type == TaskType.REPORT: # REPORT task is special
@@ -280,7 +278,7 @@ class Orchestrator:
                                 failed_task_model = await self.task_manager.get_task(next_task.task_id)
                                 if failed_task_model:
                                     await self.websocket_manager.send_personal_json(
-                                        TaskFailedMessage(payload=failed_task_model).dict(), client_id
+                                        TaskFailedMessage.message_dict(failed_task_model.model_dump()), client_id
                                     )
                                 # Continue or raise depending on how critical this is, for now we send the error content.
 
@@ -313,7 +311,7 @@ class Orchestrator:
                             failed_task_model = await self.task_manager.get_task(next_task.task_id)
                             if failed_task_model:
                                 await self.websocket_manager.send_personal_json(
-                                    TaskFailedMessage(payload=failed_task_model).dict(), client_id
+                                    TaskFailedMessage.message_dict(failed_task_model.model_dump()), client_id
                                 )
                             # This will likely lead to job failure in the main loop checks.
                             raise ValueError("Cannot complete report: Invalid report content generated.")
@@ -330,7 +328,7 @@ class Orchestrator:
                     if failed_task_model:
                         logger.info(f"Job {job_id}: Sending task failed message for task {next_task.task_id}")
                         await self.websocket_manager.send_personal_json(
-                            TaskFailedMessage(payload=failed_task_model).dict(), client_id
+                            TaskFailedMessage.message_dict(failed_task_model.model_dump()), client_id
                         )
                     # Continue to next task, or job will fail if this was critical (handled by has_errored_tasks check)
                     # No explicit JobFailedMessage here, rely on the check at the beginning of the loop.
@@ -383,6 +381,7 @@ class Orchestrator:
             logger.info(f"Job {job_id}: Research flow processing finished.")
             if job_id in self.active_jobs:
                 del self.active_jobs[job_id]
+            self.task_manager.release_job(job_id) # Its status is final; drop it from the in-memory index
 
     async def _save_report_to_file(self, job_id: str, query: str, report_content: str) -> str:
         """Saves the generated report to a file and updates the job record in DB."""
@@ -624,7 +623,7 @@ class Orchestrator:
     async def skip_task_and_resume(self, job_id: str, task_id: str):
          """Marks a task as skipped and potentially resumes the job."""
          logger.info(f"Received skip command for task {task_id} in job {job_id}.")
-         await self.task_manager.update_task_status(task_id, TaskStatus.SKIPPED, detail="Task skipped by user.")
+         await self.task_manager.update_task_status(task_id, TaskStatus.SKIPPED, error_message="Task skipped by user.")
          # If the job was paused specifically because *this task* failed, resume it.
          if job_id in self.pause_events and self.pause_events[job_id].is_set():
               # Check if the paused state was due to this task (may need better state tracking)
@@ -640,7 +639,8 @@ class Orchestrator:
             "status": status.value,
             "detail": detail
         }
-        await self.task_manager.connection_manager.broadcast_json(message) # Use TM's connection mgr
+        # Job status changes tend to arrive in bursts, so let the manager coalesce them into one frame
+        self.websocket_manager.queue_broadcast_json(message)
 
     async def broadcast_job_summary(self, summary: JobResultsSummary):
         """Broadcasts the research results summary via WebSocket."""
@@ -1,9 +1,12 @@
 import logging
+import sys
 import uuid
-from typing import Dict, Any, List, Optional, Set
-from collections import defaultdict
+import heapq
+from typing import Dict, Any, List, Optional, Set, Tuple
+from collections import defaultdict, OrderedDict
 import asyncio
 import json # For potential result serialization/deserialization if not handled by DB layer
+import orjson
 
 from models import Task, TaskStatus, TaskType, TaskInputData
 # Import the Database manager and potentially the models if needed for type hints
@@ -11,6 +14,35 @@ from database_layer.database import Database
 
 logger = logging.getLogger(__name__)
 
+TASK_CACHE_SIZE = 1024 # Max Task models kept in the get_task/get_result LRU cache
+TASK_CACHE_MAX_RESULT_BYTES = 64 * 1024 * 1024 # Budget for the (approximate) size of cached results
+STATUS_COUNTS_MAX_JOBS = 256 # Unindexed jobs whose status histogram is kept between task writes
+
+_TASK_FIELDS = frozenset(Task.model_fields.keys())
+
+def _result_size(result: Any) -> int:
+    """Approximate in-memory weight of a task result, measured as its serialized length."""
+    if result is None:
+        return 0
+    if isinstance(result, (str, bytes)):
+        return len(result)
+    try:
+        return len(orjson.dumps(result, option=orjson.OPT_NON_STR_KEYS))
+    except TypeError:
+        return len(repr(result))
+
+def _row_to_task(task_data: Dict[str, Any]) -> Task:
+    """
+    Builds a Task from a row of our own tasks table without running Pydantic validation.
+    The row was written through this class, so only the enum columns need converting back.
+    """
+    fields = {key: value for key, value in task_data.items() if key in _TASK_FIELDS}
+    fields['status'] = TaskStatus(fields['status'])
+    fields['task_type'] = TaskType(fields['task_type'])
+    # Every row of a job carries its own copy of the job_id string; intern it so they share one object
+    fields['job_id'] = sys.intern(fields['job_id'])
+    return Task.model_construct(**fields)
+
 class TaskManager:
     """Manages the lifecycle and state of tasks within research jobs using a database."""
     #This now has been migrated to use DB for persistence across restarts and also to enable viewing history 
@@ -21,6 +53,28 @@ class TaskManager:
         # self.tasks: Dict[str, Task] = {}
         # self.task_results: Dict[str, Any] = {}
         # self.job_tasks: Dict[str, List[str]] = defaultdict(list)
+        # Write-through status index for jobs created by this process. The orchestrator polls
+        # has_running/has_errored/next_pending every tick; for indexed jobs these become set lookups.
+        # Jobs not in the index (e.g. created before a restart) fall back to the database until tasks are
+        # added to them, at which point their existing rows are loaded into the index first.
+        # The orchestrator calls release_job once a job finishes, so only running jobs stay in memory.
+        self._task_jobs: Dict[str, str] = {} # task_id -> job_id
+        self._job_tasks: Dict[str, List[str]] = defaultdict(list)
+        self._status_index: Dict[str, Dict[TaskStatus, Set[str]]] = defaultdict(lambda: defaultdict(set))
+        # Per-job min-heap of (sequence_order, task_id) for PENDING tasks. Entries are removed lazily:
+        # ids that are no longer in the PENDING set are popped when they reach the head.
+        self._pending_heaps: Dict[str, List[Tuple[int, str]]] = defaultdict(list)
+        self._task_sequence: Dict[str, int] = {} # task_id -> sequence_order, to re-push retried tasks
+        # For jobs outside the index: status histogram per job, fetched with one GROUP BY and reused by
+        # has_running/has_errored/next_pending within a tick. Cleared on every task write and capped
+        # at STATUS_COUNTS_MAX_JOBS jobs.
+        self._status_counts: Dict[str, Dict[str, int]] = {}
+        # Bounded LRU of rehydrated Task models; entries are dropped whenever the task is written.
+        # Capped by count and by total result size, since reports/page dumps can be large.
+        # Evicted results are not lost: the database is the backing store.
+        self._task_cache: OrderedDict[str, Task] = OrderedDict()
+        self._task_cache_sizes: Dict[str, int] = {}
+        self._task_cache_bytes = 0
         logger.info("TaskManager initialized with Database instance.")
 
     async def add_task(
@@ -42,23 +96,125 @@ class TaskManager:
             # created_at and updated_at are handled by default_factory in Task model or DB trigger
         )
 
+        indexed = await self._ensure_job_indexed(job_id)
         try:
-            await self.db.create_task(
+            task_data = await self.db.create_task(
                 task_id=new_task.task_id,
                 job_id=new_task.job_id,
                 sequence_order=new_task.sequence_order,
                 task_type=new_task.task_type.value, # Pass enum value
                 description=new_task.description,
-                parameters=new_task.parameters # Pass the dict directly, handler serializes
+                parameters=new_task.parameters_json # Pre-encoded once on the Task model
             )
             logger.info(f"Added task {new_task.task_id} for job {job_id} to database.")
-            # Return the Pydantic model instance we created
+            if task_data:
+                new_task = _row_to_task(task_data) # Timestamps etc. exactly as stored
+            self._index_new_task(new_task, indexed)
             return new_task
         except Exception as e:
             logger.error(f"Failed to add task {task_id} for job {job_id} to DB: {e}", exc_info=True)
             # Depending on desired behavior, maybe raise or return None/error indicator
             raise # Re-raise the exception for the caller (Orchestrator) to handle
 
+    async def add_tasks(
+        self,
+        job_id: str,
+        task_inputs: List[TaskInputData],
+        start_sequence: int = 1,
+    ) -> List[Task]:
+        """
+        Adds a whole plan of tasks with a single bulk insert (one DB round-trip and one commit)
+        instead of one add_task call per task. Sequence numbers start at `start_sequence`.
+        """
+        new_tasks = [
+            Task(
+                job_id=job_id,
+                sequence_order=start_sequence + i,
+                task_type=task_input.task_type,
+                description=task_input.description,
+                parameters=task_input.parameters,
+                status=TaskStatus.PENDING
+            )
+            for i, task_input in enumerate(task_inputs)
+        ]
+        rows = [
+            (task.task_id, task.job_id, task.sequence_order, task.task_type.value, task.description,
+             task.parameters_json, task.status.value, task.created_at, task.updated_at)
+            for task in new_tasks
+        ]
+        indexed = await self._ensure_job_indexed(job_id)
+        try:
+            await self.db.create_tasks_bulk(rows)
+        except Exception as e:
+            logger.error(f"Failed to bulk-add {len(rows)} tasks for job {job_id} to DB: {e}", exc_info=True)
+            raise # Re-raise for the caller (Orchestrator) to handle
+
+        logger.info(f"Added {len(new_tasks)} tasks for job {job_id} to database in one batch.")
+        for task in new_tasks:
+            self._index_new_task(task, indexed)
+        return new_tasks
+
+    async def _ensure_job_indexed(self, job_id: str) -> bool:
+        """
+        Loads the existing rows of a job this process hasn't indexed yet (e.g. one created before a restart),
+        so tasks added to it don't leave the index with only part of the job. Returns False if the job
+        couldn't be loaded; it then stays unindexed and keeps using the database fallback.
+        """
+        if self._is_indexed(job_id):
+            return True
+        try:
+            tasks_data = await self.db.get_tasks_by_job_id(job_id)
+        except Exception as e:
+            logger.error(f"Failed to load tasks for job {job_id} into the index: {e}", exc_info=True)
+            return False
+        if not self._is_indexed(job_id): # Another add may have indexed the job while we awaited
+            self._job_tasks[job_id] = []
+            for task_data in tasks_data:
+                self._index_task(_row_to_task(task_data))
+        return True
+
+    def _index_new_task(self, task: Task, indexed: bool = True) -> None:
+        if indexed:
+            self._index_task(task)
+        else:
+            self._status_counts.pop(task.job_id, None) # The cached histogram doesn't count the new task
+
+    def _index_task(self, task: Task) -> None:
+        self._task_jobs[task.task_id] = task.job_id
+        self._job_tasks[task.job_id].append(task.task_id)
+        self._status_index[task.job_id][task.status].add(task.task_id)
+        self._task_sequence[task.task_id] = task.sequence_order
+        if task.status == TaskStatus.PENDING:
+            heapq.heappush(self._pending_heaps[task.job_id], (task.sequence_order, task.task_id))
+
+    def _index_status(self, task_id: str, status: TaskStatus) -> None:
+        """Moves task_id into the `status` set of its job's index (no-op for unindexed tasks)."""
+        job_id = self._task_jobs.get(task_id)
+        if job_id is None:
+            return
+        job_index = self._status_index[job_id]
+        for task_ids in job_index.values():
+            task_ids.discard(task_id)
+        job_index[status].add(task_id)
+        if status == TaskStatus.PENDING: # e.g. a task reset for retry; stale duplicates are skipped lazily
+            heapq.heappush(self._pending_heaps[job_id], (self._task_sequence[task_id], task_id))
+
+    def _is_indexed(self, job_id: str) -> bool:
+        return job_id in self._job_tasks
+
+    def release_job(self, job_id: str) -> None:
+        """
+        Drops a finished job (completed, failed or cancelled) from the in-memory index. Later queries
+        about it fall back to the database, and adding tasks to it loads it again.
+        """
+        for task_id in self._job_tasks.pop(job_id, ()):
+            self._task_jobs.pop(task_id, None)
+            self._task_sequence.pop(task_id, None)
+            self._uncache_task(task_id)
+        self._status_index.pop(job_id, None)
+        self._pending_heaps.pop(job_id, None)
+        self._status_counts.pop(job_id, None)
+
     async def update_task_status(
         self,
         task_id: str,
@@ -68,6 +224,9 @@ class TaskManager:
         """Updates the status and optionally the error message of a task in the database."""
         try:
             await self.db.update_task_status(task_id, status.value, error_message)
+            self._index_status(task_id, status)
+            self._status_counts.clear() # Unindexed tasks don't tell us their job, so drop every histogram
+            self._uncache_task(task_id)
             logger.debug(f"Updated task {task_id} status to {status.value} in database.")
         except Exception as e:
             logger.error(f"Failed to update status for task {task_id} in DB: {e}", exc_info=True)
@@ -78,26 +237,48 @@ class TaskManager:
         try:
             # The db handler method should handle JSON serialization
             await self.db.update_task_result(task_id, result)
+            self._uncache_task(task_id)
             logger.debug(f"Stored result for task {task_id} in database.")
         except Exception as e:
             logger.error(f"Failed to store result for task {task_id} in DB: {e}", exc_info=True)
             raise
 
     async def get_task(self, task_id: str) -> Optional[Task]:
-        """Retrieves a single task from the database by its ID."""
+        """Retrieves a single task by its ID, from the LRU cache when possible, else from the database."""
+        cached_task = self._task_cache.get(task_id)
+        if cached_task is not None:
+            self._task_cache.move_to_end(task_id)
+            return cached_task
         try:
             task_data = await self.db.get_task(task_id)
             if task_data:
                 # Convert dict from DB back to Pydantic model
-                return Task(**task_data)
+                task = _row_to_task(task_data)
+                self._cache_task(task)
+                return task
             return None
         except Exception as e:
             logger.error(f"Failed to retrieve task {task_id} from DB: {e}", exc_info=True)
             return None # Or raise?
 
+    def _cache_task(self, task: Task) -> None:
+        size = _result_size(task.result)
+        if size > TASK_CACHE_MAX_RESULT_BYTES:
+            return # Too big to be worth holding; re-read from the DB on demand
+        self._task_cache[task.task_id] = task
+        self._task_cache_sizes[task.task_id] = size
+        self._task_cache_bytes += size
+        while len(self._task_cache) > TASK_CACHE_SIZE or self._task_cache_bytes > TASK_CACHE_MAX_RESULT_BYTES:
+            evicted_id, _ = self._task_cache.popitem(last=False) # Evict least recently used
+            self._task_cache_bytes -= self._task_cache_sizes.pop(evicted_id)
+
+    def _uncache_task(self, task_id: str) -> None:
+        if self._task_cache.pop(task_id, None) is not None:
+            self._task_cache_bytes -= self._task_cache_sizes.pop(task_id)
+
     async def get_result(self, task_id: str) -> Optional[Any]:
         """Retrieves the result of a specific task from the database."""
-        task = await self.get_task(task_id) # Reuse get_task which handles deserialization
+        task = await self.get_task(task_id) # Reuse get_task, which serves repeat reads from the cache
         if task:
             return task.result
         # We could also add a specific db.get_task_result method if results are large
@@ -110,87 +291,111 @@ class TaskManager:
         try:
             tasks_data = await self.db.get_tasks_by_job_id(job_id)
             # Convert list of dicts from DB to list of Pydantic models
-            return [Task(**task_data) for task_data in tasks_data]
+            return [_row_to_task(task_data) for task_data in tasks_data]
         except Exception as e:
             logger.error(f"Failed to retrieve tasks for job {job_id} from DB: {e}", exc_info=True)
             return [] # Return empty list on error
 
     async def get_next_pending_task_for_job(self, job_id: str) -> Optional[Task]:
         """Finds the next task marked as PENDING for a specific job from the database."""
+        if self._is_indexed(job_id):
+            # O(log N) head-of-queue from the heap, then a primary-key read (often an LRU hit)
+            next_task_id = self._peek_pending(job_id)
+            return await self.get_task(next_task_id) if next_task_id else None
+        if not await self._count_status(job_id, TaskStatus.PENDING):
+            return None
         try:
             task_data = await self.db.get_next_pending_task(job_id)
             if task_data:
-                return Task(**task_data)
+                return _row_to_task(task_data)
             return None
         except Exception as e:
             logger.error(f"Failed to get next pending task for job {job_id} from DB: {e}", exc_info=True)
             return None
 
+    def _peek_pending(self, job_id: str) -> Optional[str]:
+        """Returns the lowest-sequence PENDING task id of an indexed job, discarding stale heap entries."""
+        heap = self._pending_heaps[job_id]
+        pending_ids = self._status_index[job_id][TaskStatus.PENDING]
+        while heap and heap[0][1] not in pending_ids:
+            heapq.heappop(heap)
+        return heap[0][1] if heap else None
+
     async def get_completed_tasks_for_job(self, job_id: str, task_type: Optional[TaskType] = None) -> List[Task]:
         """Retrieves all completed tasks for a job, optionally filtered by type."""
+        if self._is_indexed(job_id) and not self._status_index[job_id][TaskStatus.COMPLETED]:
+            return []
         if task_type:
             try:
                 tasks_data = await self.db.get_completed_tasks_by_type(job_id, task_type.value)
-                return [Task(**task_data) for task_data in tasks_data]
+                return [_row_to_task(task_data) for task_data in tasks_data]
             except Exception as e:
                 logger.error(f"Failed to get completed {task_type.value} tasks for job {job_id}: {e}", exc_info=True)
                 return []
         else:
-            # If no type specified, get all completed tasks (needs a new DB method or filter here)
-            # Option 1: Add db.get_completed_tasks(job_id)
-            # Option 2: Filter results from get_all_tasks_for_job (potentially inefficient)
-            # Let's assume we need all completed for now, so filter results of get_all_tasks:
+            # Filter in SQL so only completed rows are fetched and deserialized
             try:
-                all_tasks = await self.get_all_tasks_for_job(job_id)
-                return [task for task in all_tasks if task.status == TaskStatus.COMPLETED]
+                tasks_data = await self.db.get_completed_tasks(job_id)
+                return [_row_to_task(task_data) for task_data in tasks_data]
             except Exception as e:
                 logger.error(f"Failed to get all completed tasks for job {job_id}: {e}", exc_info=True)
                 return []
 
     async def has_running_tasks(self, job_id: str) -> bool:
         """Checks if there are any tasks currently RUNNING for the job in the database."""
-        try:
-            count = await self.db.count_tasks_by_status(job_id, TaskStatus.RUNNING.value)
-            return count > 0
-        except Exception as e:
-            logger.error(f"Failed to count running tasks for job {job_id}: {e}", exc_info=True)
-            return False # Assume no running tasks on error
+        if self._is_indexed(job_id):
+            return bool(self._status_index[job_id][TaskStatus.RUNNING])
+        return await self._count_status(job_id, TaskStatus.RUNNING) > 0
 
     async def has_errored_tasks(self, job_id: str) -> bool:
         """Checks if any task associated with the job has ERRORED in the database."""
+        if self._is_indexed(job_id):
+            return bool(self._status_index[job_id][TaskStatus.ERROR])
+        return await self._count_status(job_id, TaskStatus.ERROR) > 0
+
+    async def _count_status(self, job_id: str, status: TaskStatus) -> int:
+        """Task count for one status of an unindexed job, from the cached GROUP BY histogram."""
+        counts = self._status_counts.get(job_id)
+        if counts is None:
+            try:
+                counts = await self.db.get_status_counts(job_id)
+            except Exception as e:
+                logger.error(f"Failed to count task statuses for job {job_id}: {e}", exc_info=True)
+                return 0 # Assume none on error, as before
+            if len(self._status_counts) >= STATUS_COUNTS_MAX_JOBS:
+                self._status_counts.pop(next(iter(self._status_counts))) # Oldest histogram first
+            self._status_counts[job_id] = counts
+        return counts.get(status.value, 0)
+
+    async def get_job_id_for_task(self, task_id: str) -> Optional[str]:
+        """Finds the job ID associated with a given task ID."""
+        job_id = self._task_jobs.get(task_id)
+        if job_id is not None:
+            return job_id
+        try:
+            return await self.db.get_task_job_id(task_id)
+        except Exception as e:
+            logger.error(f"Failed to look up job for task {task_id} from DB: {e}", exc_info=True)
+            return None
+
+    async def is_job_complete(self, job_id: str) -> bool:
+        """Checks if all tasks for a job are in a terminal state (COMPLETED, ERROR, SKIPPED).
+        Counted with one aggregate query instead of loading every task row."""
         try:
-            count = await self.db.count_tasks_by_status(job_id, TaskStatus.ERROR.value)
-            return count > 0
+            total, unfinished = await self.db.count_unfinished_tasks(job_id)
         except Exception as e:
-            logger.error(f"Failed to count errored tasks for job {job_id}: {e}", exc_info=True)
-            return False # Assume no errored tasks on error
-
-    # --- Methods below might be obsolete or need rethinking with DB backend ---
-
-    # def get_job_id_for_task(self, task_id: str) -> Optional[str]:
-    #     """Finds the job ID associated with a given task ID."""
-    #     # This would require fetching the task from DB
-    #     task = asyncio.run(self.get_task(task_id)) # Careful with running async like this
-    #     return task.job_id if task else None
-
-    # def is_job_complete(self, job_id: str) -> bool:
-    #     """Checks if all tasks for a given job ID are in a terminal state (COMPLETED, ERROR, SKIPPED)."""
-    #     # Need to fetch all tasks for the job from DB
-    #     tasks = asyncio.run(self.get_all_tasks_for_job(job_id))
-    #     if not tasks:
-    #         logger.warning(f"No tasks found for job {job_id} when checking completion.")
-    #         return False # Or True if no tasks means complete?
-    #     return all(task.status in [TaskStatus.COMPLETED, TaskStatus.ERROR, TaskStatus.SKIPPED] for task in tasks)
-
-    # def get_final_report_task(self, job_id: str) -> Optional[Task]:
-    #     """Finds the final REPORT task for a job."""
-    #     # Need to fetch tasks from DB
-    #     report_tasks = asyncio.run(self.get_completed_tasks_for_job(job_id, TaskType.REPORT))
-    #     if report_tasks:
-    #         return report_tasks[-1] # Assume last one if multiple?
-    #     return None
-
-# Note: Removed methods relying on internal state (job_tasks, etc.)
-# and commented out methods that would require synchronous DB calls within async methods
-# or need to be reimplemented carefully using the async db methods.
-# The Orchestrator will likely handle job completion logic based on task statuses from DB.
\ No newline at end of file
+            logger.error(f"Failed to check completion of job {job_id} from DB: {e}", exc_info=True)
+            return False
+        if not total:
+            logger.warning(f"No tasks found for job {job_id} when checking completion.")
+            return False
+        return unfinished == 0
+
+    async def get_final_report_task(self, job_id: str) -> Optional[Task]:
+        """Finds the last completed REPORT task for a job."""
+        try:
+            task_data = await self.db.get_last_completed_task_by_type(job_id, TaskType.REPORT.value)
+            return _row_to_task(task_data) if task_data else None
+        except Exception as e:
+            logger.error(f"Failed to get final report task for job {job_id} from DB: {e}", exc_info=True)
+            return None
@@ -0,0 +1,91 @@
+"""
+Tests for TaskManager's in-memory status index.
+Run from research_agent_backend: python -m pytest tests
+"""
+
+import asyncio
+import os
+import sys
+
+# Backend modules use flat imports (e.g. `from models import ...`), so put research_agent_backend on the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database_layer.database import Database
+from models import TaskInputData, TaskStatus, TaskType
+from task_manager import TaskManager
+
+
+async def _open_database(db_path):
+    # A fresh instance per "process" rather than the Database.get_instance singleton
+    database = Database(db_path)
+    await database._initialize_database()
+    return database
+
+
+def _inputs(*descriptions):
+    return [TaskInputData(task_type=TaskType.SEARCH, description=description, parameters={}) for description in descriptions]
+
+
+async def _add_tasks_after_restart(db_path):
+    # First process: plan a job and get partway through it
+    database = await _open_database(db_path)
+    task_manager = TaskManager(database)
+    await database.create_job("job", "query")
+    done, running, pending = await task_manager.add_tasks("job", _inputs("done", "running", "pending"))
+    await task_manager.update_task_status(done.task_id, TaskStatus.COMPLETED)
+    await task_manager.update_task_status(running.task_id, TaskStatus.RUNNING)
+    await database.close()
+
+    # Restarted process: the job is unknown to the new index until more tasks are added to it
+    database = await _open_database(db_path)
+    task_manager = TaskManager(database)
+    (added,) = await task_manager.add_tasks("job", _inputs("added"), start_sequence=4)
+    try:
+        return {
+            "next_pending": (await task_manager.get_next_pending_task_for_job("job")).task_id,
+            "has_running": await task_manager.has_running_tasks("job"),
+            "completed": [task.task_id for task in await task_manager.get_completed_tasks_for_job("job")],
+            "is_complete": await task_manager.is_job_complete("job"),
+            "expected": (done.task_id, pending.task_id),
+            "added": added.task_id,
+        }
+    finally:
+        await database.close()
+
+
+def test_tasks_added_after_restart_keep_earlier_rows_indexed(tmp_path):
+    state = asyncio.run(_add_tasks_after_restart(str(tmp_path / "research.db")))
+    done_id, pending_id = state["expected"]
+    assert state["next_pending"] == pending_id # Not the task added after the restart
+    assert state["has_running"]
+    assert state["completed"] == [done_id]
+    assert not state["is_complete"]
+
+
+async def _release_finished_job(db_path):
+    database = await _open_database(db_path)
+    task_manager = TaskManager(database)
+    await database.create_job("job", "query")
+    tasks = await task_manager.add_tasks("job", _inputs("first", "second"))
+    for task in tasks:
+        await task_manager.update_task_status(task.task_id, TaskStatus.COMPLETED)
+    task_manager.release_job("job")
+    try:
+        return {
+            "index": [task_manager._task_jobs, task_manager._job_tasks, task_manager._status_index,
+                      task_manager._pending_heaps, task_manager._task_sequence],
+            # Answered from the database now that the job is out of the index
+            "completed": [task.task_id for task in await task_manager.get_completed_tasks_for_job("job")],
+            "next_pending": await task_manager.get_next_pending_task_for_job("job"),
+            "is_complete": await task_manager.is_job_complete("job"),
+            "expected": [task.task_id for task in tasks],
+        }
+    finally:
+        await database.close()
+
+
+def test_released_job_leaves_index_and_falls_back_to_database(tmp_path):
+    state = asyncio.run(_release_finished_job(str(tmp_path / "research.db")))
+    assert all(not entries for entries in state["index"])
+    assert state["completed"] == state["expected"]
+    assert state["next_pending"] is None
+    assert state["is_complete"]
@@ -0,0 +1,107 @@
+"""
+Tests for ConnectionManager's per-client batching.
+Run from research_agent_backend: python -m pytest tests
+"""
+
+import asyncio
+import os
+import sys
+
+import orjson
+
+# Backend modules use flat imports (e.g. `from models import ...`), so put research_agent_backend on the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import websocket_manager
+from websocket_manager import ConnectionManager
+
+
+class FakeWebSocket:
+    """Records what the sender task sends."""
+
+    client = "test-client"
+
+    def __init__(self):
+        self.frames = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.frames.append(text)
+
+    async def send_bytes(self, data):
+        self.frames.append(data)
+
+
+async def _queue_flushed_batch_behind_message(binary_frames):
+    manager = ConnectionManager()
+    websocket = FakeWebSocket()
+    await manager.connect(websocket, "client", binary_frames=binary_frames)
+
+    # Queue both before the sender task runs, so it folds them into one frame
+    await manager.broadcast_json({"type": "log", "message": "first"})
+    manager.queue_broadcast_json({"type": "status", "task_id": "a"})
+    manager.queue_broadcast_json({"type": "status", "task_id": "b"})
+    await manager.flush_updates()
+    await asyncio.sleep(0.01)
+
+    manager.disconnect("client")
+    return [orjson.loads(frame) for frame in websocket.frames]
+
+
+def test_flushed_batch_is_spliced_into_sender_batch():
+    frames = asyncio.run(_queue_flushed_batch_behind_message(binary_frames=False))
+    assert frames == [{
+        "type": "batch",
+        "items": [
+            {"type": "log", "message": "first"},
+            {"type": "status", "task_id": "a"},
+            {"type": "status", "task_id": "b"},
+        ],
+    }]
+
+
+def test_flushed_batch_is_spliced_into_binary_sender_batch():
+    frames = asyncio.run(_queue_flushed_batch_behind_message(binary_frames=True))
+    assert len(frames) == 1
+    assert [item["type"] for item in frames[0]["items"]] == ["log", "status", "status"]
+
+
+async def _overflow_slow_client():
+    manager = ConnectionManager()
+    websocket = FakeWebSocket()
+    await manager.connect(websocket, "client")
+
+    # Nothing is sent until the sender task runs, so the client looks stalled while all of these queue up
+    await manager.broadcast_json({"type": "task_success", "task_id": "kept"})
+    for step in range(websocket_manager.CLIENT_QUEUE_MAXSIZE + 5):
+        await manager.broadcast_json({"type": "job_progress", "job_id": "job", "step": step})
+    await manager.broadcast_json({"type": "final_report", "job_id": "job"})
+    queued = [orjson.loads(text) for text, _, _, _ in manager._client_queues["client"]._queue]
+
+    manager.disconnect("client")
+    return queued
+
+
+def test_full_queue_drops_only_stale_status_updates():
+    queued = asyncio.run(_overflow_slow_client())
+    assert queued[0] == {"type": "task_success", "task_id": "kept"}
+    assert queued[-1] == {"type": "final_report", "job_id": "job"}
+    progress = [message["step"] for message in queued if message["type"] == "job_progress"]
+    assert len(progress) == websocket_manager.CLIENT_QUEUE_MAXSIZE - 1
+    assert progress[-1] == websocket_manager.CLIENT_QUEUE_MAXSIZE + 4 # Newest update survives
+
+
+async def _reconnect_same_client():
+    manager = ConnectionManager()
+    await manager.connect(FakeWebSocket(), "client")
+    first_sender = manager._client_senders["client"]
+    await manager.connect(FakeWebSocket(), "client")
+    await asyncio.sleep(0)
+    cancelled = first_sender.cancelled()
+    manager.disconnect("client")
+    return cancelled
+
+
+def test_reconnect_cancels_previous_sender():
+    assert asyncio.run(_reconnect_same_client())
@@ -1,67 +1,221 @@
-import json
 import logging
-from typing import Dict
+import asyncio
+import orjson
+from typing import Dict, List, Optional, Set, Tuple
 from fastapi import WebSocket
 
 logger = logging.getLogger(__name__)
 
+BROADCAST_COALESCE_WINDOW = 0.05 # Seconds; updates queued within this window go out as one frame
+CLIENT_QUEUE_MAXSIZE = 256 # Queued messages per client beyond which status updates start being dropped
+MAX_BATCH_SIZE = 50 # Max queued JSON messages folded into a single "batch" frame
+
+# orjson (Rust) replaces json.dumps for every outgoing message. NON_STR_KEYS keeps json.dumps'
+# tolerance for int keys; SERIALIZE_NUMPY covers arrays/scores produced by the agents.
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+# Start of a serialized batch frame (orjson emits no whitespace and keeps key order). Batches queued by
+# flush_updates are spliced into the sender's batch rather than nested, since clients unwrap one level only.
+BATCH_PREFIX = '{"type":"batch","items":['
+BATCH_PREFIX_BYTES = BATCH_PREFIX.encode("utf-8")
+BATCH_SUFFIX = "]}"
+
+# Progress/status updates are superseded by the next one for the same job, so they (and the batches
+# flush_updates builds from them) are the only messages a slow client's queue may drop. Everything else
+# (task results, final reports, failures) is always delivered.
+STATUS_MESSAGE_TYPES = frozenset({"job_status", "job_progress", "batch"})
+
+# Queue item: (text, is_json, payload, status_key). JSON items can be folded into a batch frame; raw text is
+# sent on its own. payload is the orjson bytes the text was decoded from (shared by every client), or None if
+# not at hand. status_key is set for droppable status updates (see _status_key) and None otherwise.
+OutgoingMessage = Tuple[str, bool, Optional[bytes], Optional[str]]
+
+def _status_key(data: dict) -> Optional[str]:
+    """Coalescing key ("<type>:<job_id>") of a droppable status update, or None for messages that must be delivered."""
+    message_type = data.get("type")
+    if message_type not in STATUS_MESSAGE_TYPES:
+        return None
+    payload = data.get("payload")
+    job_id = data.get("job_id") or (payload.get("job_id") if isinstance(payload, dict) else None)
+    return f"{message_type}:{job_id}"
+
 class ConnectionManager:
     def __init__(self):
         self.active_connections: Dict[str, WebSocket] = {}
+        # Each client gets its own outgoing queue drained by a dedicated sender task, so broadcasting
+        # never awaits a socket and a backlog is sent as one frame instead of one frame per message.
+        self._client_queues: Dict[str, asyncio.Queue] = {}
+        self._client_senders: Dict[str, asyncio.Task] = {}
+        # Status updates queued via queue_broadcast_json, flushed together as a single "batch" frame
+        self._pending_updates: List[dict] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # Timer-started flushes, kept referenced so they aren't garbage collected mid-send
+        self._flush_tasks: Set[asyncio.Task] = set()
 
-    async def connect(self, websocket: WebSocket, client_id: str):
+    async def connect(self, websocket: WebSocket, client_id: str, binary_frames: bool = False):
+        """
+        Registers a client. With binary_frames=True, JSON is sent as binary frames of the shared
+        orjson bytes, skipping the per-client UTF-8 encode of text frames (the client must decode them).
+        """
         await websocket.accept()
+        previous_sender = self._client_senders.pop(client_id, None)
+        if previous_sender is not None:
+            previous_sender.cancel() # Reconnect with the same id; the old sender would wait on its queue forever
         self.active_connections[client_id] = websocket
+        queue: asyncio.Queue = asyncio.Queue() # Unbounded; _enqueue caps the status updates in it
+        self._client_queues[client_id] = queue
+        self._client_senders[client_id] = asyncio.create_task(self._client_sender(client_id, websocket, queue, binary_frames))
         logger.info(f"WebSocket client {client_id} ({websocket.client}) connected. Total clients: {len(self.active_connections)}")
 
     def disconnect(self, client_id: str):
         websocket = self.active_connections.pop(client_id, None)
+        self._client_queues.pop(client_id, None)
+        sender = self._client_senders.pop(client_id, None)
+        if sender is not None and sender is not asyncio.current_task():
+            sender.cancel()
         if websocket:
             logger.info(f"WebSocket client {client_id} ({websocket.client}) disconnected. Total clients: {len(self.active_connections)}")
 
-    async def send_personal_message(self, message: str, client_id: str):
-        websocket = self.active_connections.get(client_id)
-        if websocket:
+    async def _client_sender(self, client_id: str, websocket: WebSocket, queue: asyncio.Queue, binary_frames: bool = False):
+        """Drains one client's queue. Whatever JSON has piled up is sent as a single batch frame."""
+        carried: Optional[OutgoingMessage] = None
+        while True:
+            message = carried if carried is not None else await queue.get()
+            carried = None
+            text, is_json, payload, _ = message
+            batch = [message]
+            if is_json:
+                while len(batch) < MAX_BATCH_SIZE and not queue.empty():
+                    next_message = queue.get_nowait()
+                    if not next_message[1]:
+                        carried = next_message # Raw text keeps its own frame, sent next
+                        break
+                    batch.append(next_message)
             try:
-                # Safely create a preview of the message for logging
-                message_preview = str(message)[:400] + "..." if len(str(message)) > 100 else str(message)
-                logger.info(f"Sending personal message to client {client_id}: {message_preview}")
-                await websocket.send_text(message)
-                logger.info(f"Successfully sent personal message to client {client_id}")
+                if is_json and binary_frames:
+                    # Send the bytes produced once by orjson; only batch framing is per client
+                    chunks = [p if p is not None else t.encode("utf-8") for t, _, p, _ in batch]
+                    if len(chunks) == 1:
+                        frame = chunks[0]
+                    else:
+                        items = [self._batch_items(c, BATCH_PREFIX_BYTES) for c in chunks]
+                        frame = BATCH_PREFIX_BYTES + b",".join(i for i in items if i) + BATCH_SUFFIX.encode("utf-8")
+                    await websocket.send_bytes(frame)
+                    continue
+                if len(batch) > 1:
+                    # Items are already-serialized JSON documents, so the batch frame is a plain join
+                    items = [self._batch_items(t, BATCH_PREFIX) for t, _, _, _ in batch]
+                    text = BATCH_PREFIX + ",".join(i for i in items if i) + BATCH_SUFFIX
+                await websocket.send_text(text)
             except Exception as e:
-                logger.error(f"Failed to send personal message to client {client_id} ({websocket.client}): {e}")
+                logger.error("Failed to send to client %s (%s): %s. Removing client.", client_id, websocket.client, e)
+                self.disconnect(client_id)
+                return
+
+    @staticmethod
+    def _batch_items(document, prefix):
+        """The comma-joined items of a serialized batch frame, or the document itself if it is not a batch."""
+        if document.startswith(prefix):
+            return document[len(prefix):-len(BATCH_SUFFIX)]
+        return document
+
+    def _enqueue(self, client_id: str, queue: asyncio.Queue, message: OutgoingMessage):
+        status_key = message[3]
+        if status_key is None or queue.qsize() < CLIENT_QUEUE_MAXSIZE:
+            queue.put_nowait(message)
+            return
+        # Slow client with a full backlog: rather than block the producer, drop a queued status update,
+        # preferring an older one for the same job. If only must-deliver messages are queued, drop this one.
+        queued = [queue.get_nowait() for _ in range(queue.qsize())]
+        stale = next((i for i, (_, _, _, key) in enumerate(queued) if key == status_key), None)
+        if stale is None:
+            stale = next((i for i, (_, _, _, key) in enumerate(queued) if key is not None), None)
+        if stale is not None:
+            del queued[stale]
+            queued.append(message)
+        for queued_message in queued:
+            queue.put_nowait(queued_message)
+        logger.warning("Outgoing queue full for client %s; dropped a stale status update.", client_id)
+
+    async def send_personal_message(self, message: str, client_id: str, is_json: bool = False, payload: Optional[bytes] = None,
+                                    status_key: Optional[str] = None):
+        queue = self._client_queues.get(client_id)
+        if queue is not None:
+            if logger.isEnabledFor(logging.DEBUG):
+                message_preview = message[:400] + "..." if len(message) > 400 else message
+                logger.debug("Queueing personal message for client %s: %s", client_id, message_preview)
+            self._enqueue(client_id, queue, (message, is_json, payload, status_key))
         else:
-            logger.warning(f"Cannot send personal message: client {client_id} not found in active connections")
+            logger.warning("Cannot send personal message: client %s not found in active connections", client_id)
 
     async def send_personal_json(self, data: dict, client_id: str):
-        json_str = json.dumps(data)
-        # Safely create a preview of the JSON for logging
-        json_preview = json_str[:100] + "..." if len(json_str) > 100 else json_str
-        logger.info(f"Sending JSON data with type '{data.get('type', 'unknown')}' to client {client_id}: {json_preview}")
-        await self.send_personal_message(json_str, client_id)
-
-    async def broadcast(self, message: str):
-        disconnected_client_ids = []
-        active_connections_snapshot = dict(self.active_connections)
-        
-        # Safely create a preview of the message for logging
-        message_preview = str(message)[:100] + "..." if len(str(message)) > 100 else str(message)
-        logger.info(f"Broadcasting message to {len(active_connections_snapshot)} clients: {message_preview}")
-        
-        for client_id, connection in active_connections_snapshot.items():
-            try:
-                await connection.send_text(message)
-                logger.info(f"Successfully broadcast to client {client_id}")
-            except Exception as e:
-                logger.error(f"Failed to broadcast to client {client_id} ({connection.client}): {e}. Marking for removal.")
-                disconnected_client_ids.append(client_id)
+        payload = orjson.dumps(data, option=ORJSON_OPTIONS)
+        json_str = payload.decode("utf-8")
+        if logger.isEnabledFor(logging.DEBUG):
+            # Only pay for the preview slice when it will actually be logged
+            json_preview = json_str[:100] + "..." if len(json_str) > 100 else json_str
+            logger.debug("Sending JSON data with type '%s' to client %s: %s", data.get('type', 'unknown'), client_id, json_preview)
+        await self.send_personal_message(json_str, client_id, is_json=True, payload=payload, status_key=_status_key(data))
+
+    async def broadcast(self, message: str, is_json: bool = False, payload: Optional[bytes] = None, status_key: Optional[str] = None):
+        if not self.active_connections:
+            return # Nobody to send to (e.g. headless runs or before the UI connects)
+        if logger.isEnabledFor(logging.DEBUG):
+            message_preview = message[:100] + "..." if len(message) > 100 else message
+            logger.debug("Broadcasting message to %d clients: %s", len(self._client_queues), message_preview)
+
+        # Only enqueue here; each client's sender task does the (slow) socket send.
+        # _enqueue never awaits or disconnects, so iterating the live dict without a copy is safe.
+        # Every client gets the same (text, payload) objects; nothing is re-serialized per client.
+        outgoing: OutgoingMessage = (message, is_json, payload, status_key)
+        for client_id, queue in self._client_queues.items():
+            self._enqueue(client_id, queue, outgoing)
 
-        for cid_to_remove in disconnected_client_ids:
-            self.disconnect(cid_to_remove)
+    async def broadcast_bytes(self, payload: bytes, status_key: Optional[str] = None):
+        """Broadcasts an already-serialized JSON payload. Decoded once and shared by every client."""
+        await self.broadcast(payload.decode("utf-8"), is_json=True, payload=payload, status_key=status_key)
 
     async def broadcast_json(self, data: dict):
-        json_str = json.dumps(data)
-        # Safely create a preview of the JSON for logging
-        json_preview = json_str[:100] + "..." if len(json_str) > 100 else json_str
-        logger.info(f"Broadcasting JSON data with type '{data.get('type', 'unknown')}': {json_preview}")
-        await self.broadcast(json_str)
\ No newline at end of file
+        if not self.active_connections:
+            return # Skip serialization entirely when there is no one to send to
+        # Serialize once with orjson; the same payload is reused for every connected client
+        payload = orjson.dumps(data, option=ORJSON_OPTIONS)
+        if logger.isEnabledFor(logging.DEBUG):
+            # Only pay for the preview slice when it will actually be logged
+            json_preview = payload[:100].decode("utf-8", "ignore") + "..." if len(payload) > 100 else payload.decode("utf-8")
+            logger.debug("Broadcasting JSON data with type '%s': %s", data.get('type', 'unknown'), json_preview)
+        await self.broadcast_bytes(payload, status_key=_status_key(data))
+
+    def queue_broadcast_json(self, data: dict):
+        """
+        Queues a status update for broadcast. Updates arriving within BROADCAST_COALESCE_WINDOW
+        are sent to every client as one {"type": "batch", "items": [...]} frame instead of one frame each.
+        """
+        if not self.active_connections:
+            return # Don't accumulate updates nobody will receive
+        self._pending_updates.append(data)
+        if self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(BROADCAST_COALESCE_WINDOW, self._flush_updates)
+
+    def _flush_updates(self):
+        self._flush_handle = None
+        task = asyncio.create_task(self.flush_updates())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_done)
+
+    def _flush_done(self, task: asyncio.Task):
+        self._flush_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Failed to flush queued status updates", exc_info=task.exception())
+
+    async def flush_updates(self):
+        """Sends any queued status updates now. Also called on shutdown so nothing is left behind."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        updates, self._pending_updates = self._pending_updates, []
+        if not updates:
+            return
+        # A lone update is sent as-is so clients see the usual message shape
+        await self.broadcast_json(updates[0] if len(updates) == 1 else {"type": "batch", "items": updates})
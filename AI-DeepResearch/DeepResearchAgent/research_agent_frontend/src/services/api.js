@@ -172,7 +172,12 @@ export const createWebSocketConnection = (clientId, onMessage, onReconnect, onCo
         console.log('Parsed WebSocket message structure:', JSON.stringify(data, null, 2));
         
         if (onMessage && typeof onMessage === 'function') {
-          onMessage(data);
+          // Bursts of status updates arrive coalesced into a single batch frame
+          if (data.type === 'batch' && Array.isArray(data.items)) {
+            data.items.forEach((item) => onMessage(item));
+          } else {
+            onMessage(data);
+          }
         }
       } catch (error) {
         console.error('Error processing WebSocket message:', error, event.data?.substring(0, 200));
@@ -1,133 +1,361 @@
+import asyncio
+import functools
+import os
 import faiss
-from langchain_ollama import OllamaLLM
-from sentence_transformers import SentenceTransformer
-from collections import deque
+from ollama import AsyncClient
+from collections import OrderedDict
+import heapq
+import itertools
+import hashlib
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 import logging
+import re
+import threading
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 # Configuration
 LLM_MODEL_NAME = "qwen2.5:7b"  
 LLM_TEMPERATURE = 0.6
+OLLAMA_HOST = "http://localhost:11434"
+LLM_OPTIONS = {"temperature": LLM_TEMPERATURE, "top_p": 0.9, "num_ctx": 4096}
 dimension = 384  
+# Batched answers come back as "### <n>" sections, one per numbered question
+ANSWER_TAG_RE = re.compile(r"^\s*###\s*(\d+)\s*[:.)]?\s*$", re.MULTILINE)
+# One question per line, optionally numbered ("1.", "2)") or bulleted; preamble lines without a "?" are skipped
+QUERY_RE = re.compile(r"^\s*(?:\d+[.)]\s*|[-*]\s*)?(.+?\?)\s*$", re.MULTILINE)
+WORD_RE = re.compile(r"\w+")
+# Prefilter: a response this short that shares fewer than this many words with the prompt is rejected unembedded
+PREFILTER_MIN_OVERLAP = 2
+PREFILTER_MIN_CHARS = 40
+EMBED_BATCH_SIZE = 64
+# all-MiniLM-L6-v2 only looks at the first 256 tokens, but tokenizes everything it is given; ~1200 chars covers them
+EMBED_MAX_CHARS = 1200
+EMBED_CACHE_SIZE = 4096  # Embeddings kept by content hash, so repeated text is never re-encoded
+INDEX_ADD_BATCH = 32  # Accepted vectors buffered before a single index.add
+INDEX_UPGRADE_THRESHOLD = 1024  # Past this many vectors, brute-force search is swapped for HNSW
+HNSW_M = 32
+QUERY_QUEUE_LIMIT = 64  # Lowest-scoring queued queries are dropped beyond this
+FRONTIER_WIDTH = 4  # Queued queries explored concurrently; set OLLAMA_NUM_PARALLEL >= this on the Ollama server
 
-# Initialize LLM
-llm = OllamaLLM(
-    model=LLM_MODEL_NAME,
-    base_url="http://localhost:11434",
-    temperature=LLM_TEMPERATURE,
-    top_p=0.9,
-    num_ctx=4096
-)
+# FAISS's OpenMP pool is process-wide, so it is sized once at startup (configure_faiss_threads). Single-query
+# searches of these small indexes are cheaper on one thread than paying OpenMP fork/join per call.
+FAISS_NUM_THREADS = int(os.getenv("FAISS_NUM_THREADS", "1"))
 
+# The LLM client and embedder are built on first use, not at import, and shared by every simulator
+@functools.cache
+def get_llm():
+    # The native client is a thin HTTP wrapper; no LangChain callback/tracing layer per call
+    return AsyncClient(host=OLLAMA_HOST)
 
-embedder = SentenceTransformer('all-MiniLM-L6-v2')
-index = faiss.IndexFlatL2(dimension)  
+@functools.cache
+def get_embedder():
+    # torch (which sentence_transformers pulls in) is slow to import, so only load it once embedding is needed
+    import torch
+    from sentence_transformers import SentenceTransformer
+    # Embed on the GPU in fp16 when one is available (much higher throughput); fall back to CPU fp32
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    embedder = SentenceTransformer('all-MiniLM-L6-v2', device=device)
+    if device == "cuda":
+        embedder.half()
+    return embedder
+
+def configure_faiss_threads():
+    """Applies FAISS_NUM_THREADS once per process; an explicit OMP_NUM_THREADS takes precedence."""
+    if "OMP_NUM_THREADS" not in os.environ:
+        faiss.omp_set_num_threads(FAISS_NUM_THREADS)
+
+def new_context_index():
+    """Each simulator gets its own index, since row ids map into that simulator's context_data."""
+    # Embeddings are L2-normalized, so inner product == cosine similarity: one metric for search and relevance
+    return faiss.IndexFlatIP(dimension)
 
 class DeepResearchSimulator:
     def __init__(self):
-        self.context_vectors = []  
+        self.llm = get_llm()
+        self.embedder = get_embedder()
         self.context_data = []  # Store (query, response) pairs
-        self.query_queue = deque()  # Queue of sub-queries
-        self.visited_queries = set()  # Track explored queries
+        self.index = new_context_index()  # Replaced by an HNSW index once the context grows past INDEX_UPGRADE_THRESHOLD
+        self._query_buf = np.empty((1, dimension), dtype=np.float32)  # Reused for every index.search
+        self._pending_vectors = []  # Accepted embeddings not yet added to the FAISS index (same order as context_data)
+        # Max-heap of (-predicted_relevance, tie_breaker, query, depth): the most promising sub-queries are
+        # explored first, so the LLM budget isn't spent on weak branches just because they were queued earlier
+        self.query_queue = []
+        self._queue_counter = itertools.count()
+        self.visited_queries = set()  # Track explored queries, as 16-byte digests of the canonical query text
+        self._seen_queries = set()  # Keys of every query ever queued, so a branch is pushed at most once
         self.initial_prompt_embedding = None
+        self._prompt_tokens = set()  # Lower-cased words of the initial prompt, for the cheap relevance prefilter
+        self._embedding_cache = OrderedDict()  # blake2b(text) -> embedding, LRU
+        self._embedding_lock = threading.Lock()  # Encodes run in executor threads
         self.max_depth = 4  # Limit exploration depth
         self.relevance_threshold = 0.39  # Minimum relevance score ---> needs to be fine tuned based on use case, this is just a starting point and can vary based on monitoring each use case of the app
         #todo: the above relevance score threshold might not always be valid, and this needs to be fine tuned as it might eliminate some relevant data and we might miss this in research
 
+    @staticmethod
+    def _text_key(text):
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    @staticmethod
+    def _query_key(query):
+        """Fixed-size key for a query; whitespace/case variants of the same question share one key."""
+        return hashlib.blake2b(query.strip().casefold().encode("utf-8"), digest_size=16).digest()
+
+    def _cache_embedding(self, key, embedding):
+        with self._embedding_lock:
+            self._embedding_cache[key] = embedding
+            if len(self._embedding_cache) > EMBED_CACHE_SIZE:
+                self._embedding_cache.popitem(last=False)  # Evict least recently used
+
+    def _cached_embedding(self, key):
+        with self._embedding_lock:
+            embedding = self._embedding_cache.get(key)
+            if embedding is not None:
+                self._embedding_cache.move_to_end(key)
+            return embedding
+
     def embed_text(self, text):     
-        """Generate embedding for text."""
-        return embedder.encode(text, convert_to_tensor=False)
+        """Generate a unit-length embedding for text."""
+        text = text[:EMBED_MAX_CHARS]
+        key = self._text_key(text)
+        embedding = self._cached_embedding(key)
+        if embedding is not None:
+            return embedding
+        embedding = self.embedder.encode(text, convert_to_tensor=False, normalize_embeddings=True).astype(np.float32, copy=False)  # FAISS needs float32
+        self._cache_embedding(key, embedding)
+        return embedding
+
+    def embed_texts(self, texts):
+        """Embed many texts in one encode call. SentenceTransformer length-sorts the inputs into padded
+        mini-batches itself (smart batching) and returns rows in the original order.
+        Only texts missing from the embedding cache are encoded."""
+        texts = [text[:EMBED_MAX_CHARS] for text in texts]
+        embeddings = [self._cached_embedding(self._text_key(text)) for text in texts]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            encoded = self.embedder.encode([texts[i] for i in missing], batch_size=EMBED_BATCH_SIZE, convert_to_numpy=True, normalize_embeddings=True)
+            encoded = encoded.astype(np.float32, copy=False)  # fp16 on GPU; FAISS needs float32
+            for i, embedding in zip(missing, encoded):
+                self._cache_embedding(self._text_key(texts[i]), embedding)
+                embeddings[i] = embedding
+        return embeddings
+
+    async def embed_text_async(self, text):
+        """embed_text on a worker thread, so pending LLM calls keep progressing during the encode."""
+        return await asyncio.get_running_loop().run_in_executor(None, self.embed_text, text)
+
+    async def embed_texts_async(self, texts):
+        return await asyncio.get_running_loop().run_in_executor(None, self.embed_texts, texts)
 
-    def initialize_exploration(self, initial_prompt):
+    async def initialize_exploration(self, initial_prompt):
         """Start with the initial prompt."""
-        self.initial_prompt_embedding = self.embed_text(initial_prompt)
-        initial_queries = self.generate_sub_queries(initial_prompt, "")
-        for query in initial_queries:
-            logger.info(f"Exploring: {query}")
-            self.query_queue.append((query, 0))  # (query, depth)
+        self._prompt_tokens = set(WORD_RE.findall(initial_prompt.lower()))
+        # The prompt embedding and the first sub-query generation are independent, so run them together
+        self.initial_prompt_embedding, initial_queries = await asyncio.gather(
+            self.embed_text_async(initial_prompt),
+            self.generate_sub_queries(initial_prompt, ""),
+        )
+        await self.enqueue_queries(initial_queries, 0)
 
-    def generate_sub_queries(self, prompt, context):
+    async def enqueue_queries(self, queries, depth):
+        """Queue unvisited sub-queries, prioritised by their cosine similarity to the initial prompt.
+        All of them are scored with a single batched encode."""
+        unseen = []
+        for query in queries:
+            key = self._query_key(query)
+            # Checked on push, not pop: parents often propose the same sub-query, and each duplicate would cost an LLM call
+            if key in self._seen_queries or key in self.visited_queries:
+                continue
+            self._seen_queries.add(key)
+            unseen.append(query)
+        queries = unseen
+        if not queries:
+            return
+        query_embeddings = await self.embed_texts_async(queries)
+        scores = np.stack(query_embeddings) @ self.initial_prompt_embedding
+        for query, score in zip(queries, scores):
+            logger.info(f"Queued: {query} (predicted relevance {score:.3f})")
+            heapq.heappush(self.query_queue, (-float(score), next(self._queue_counter), query, depth))
+        if len(self.query_queue) > QUERY_QUEUE_LIMIT:
+            self.query_queue = heapq.nsmallest(QUERY_QUEUE_LIMIT, self.query_queue)  # A sorted list is a valid heap
+
+    async def stream_llm(self, prompt, on_line=None):
+        """Stream a completion, returning the full text. `on_line` (if given) is called with each
+        completed line while later tokens are still being generated."""
+        chunks = []
+        pending_line = ""
+        async for part in await self.llm.generate(model=LLM_MODEL_NAME, prompt=prompt, options=LLM_OPTIONS, stream=True):
+            chunk = part["response"]
+            chunks.append(chunk)
+            if on_line is not None:
+                pending_line += chunk
+                *lines, pending_line = pending_line.split("\n")
+                for line in lines:
+                    on_line(line)
+        if on_line is not None and pending_line:
+            on_line(pending_line)
+        return "".join(chunks)
+
+    async def generate_sub_queries(self, prompt, context):
         """Generate sub-queries using the LLM."""
         if context:
             query_prompt = f"Based on '{context}', generate 5 follow-up questions to explore '{prompt}' deeper."
         else:
             query_prompt = f"Generate 3 sub-questions to explore '{prompt}'."
-        response = llm(query_prompt)
+        queries = []
+        # Questions are picked out line by line while the rest of the list is still streaming in
+        response = await self.stream_llm(query_prompt, on_line=lambda line: queries.extend(QUERY_RE.findall(line)))
         logger.info(f"Generated sub-queries for query{prompt}: {response}")
-        return [q.strip() for q in response.strip().split("\n") if q.strip()]
+        if not queries:
+            # The model didn't phrase them as questions; keep the old line-per-query behaviour
+            return [q.strip() for q in response.strip().split("\n") if q.strip()]
+        return queries
 
-    def generate_response(self, query):
+    async def generate_response(self, query):
         """Generate a response using the LLM."""
-        return llm(query).strip()
+        return (await self.stream_llm(query)).strip()
+
+    async def generate_responses_batched(self, queries):
+        """Answer several queries with one LLM call instead of one round-trip (and prefill) per query."""
+        if len(queries) == 1:
+            return [await self.generate_response(queries[0])]
+        numbered = "\n".join(f"{i}) {q}" for i, q in enumerate(queries, 1))
+        batch_prompt = (
+            "Answer each question below. Start every answer with a line containing only "
+            f"'### <number>' for the question it answers.\n\n{numbered}"
+        )
+        response = await self.stream_llm(batch_prompt)
+        parts = ANSWER_TAG_RE.split(response)  # [preamble, tag, answer, tag, answer, ...]
+        answers = {}
+        for tag, answer in zip(parts[1::2], parts[2::2]):
+            answers.setdefault(int(tag), answer.strip())
+        missing = [i for i in range(1, len(queries) + 1) if not answers.get(i)]
+        if missing:
+            # The model didn't follow the format for some questions; ask for those individually
+            logger.warning(f"Batched response missing answers for {len(missing)} of {len(queries)} queries, retrying them singly")
+            retried = await asyncio.gather(*(self.generate_response(queries[i - 1]) for i in missing))
+            answers.update(zip(missing, retried))
+        return [answers[i] for i in range(1, len(queries) + 1)]
+
+    def is_obvious_reject(self, query, response):
+        """Cheap textual gate run before embedding: short responses with almost no word overlap with
+        the initial prompt can't pass the relevance threshold, so skip their SBERT forward pass."""
+        if len(response) >= PREFILTER_MIN_CHARS:
+            return False
+        overlap = len(self._prompt_tokens & set(WORD_RE.findall(response.lower())))
+        if overlap < PREFILTER_MIN_OVERLAP:
+            logger.info(f"Rejected '{query}' by prefilter (overlap {overlap}, {len(response)} chars)")
+            return True
+        return False
 
     def evaluate_response(self, response_embedding):
         """Evaluate relevance using cosine similarity.This can be fine tunes as well"""
-        similarity = cosine_similarity(
-            self.initial_prompt_embedding.reshape(1, -1),
-            response_embedding.reshape(1, -1)
-        )[0][0]
-        return similarity
-
-    def add_to_context(self, query, response):
-        """Store query-response pair in the vector database."""
-        combined_text = f"{query}: {response}"
-        embedding = self.embed_text(combined_text)
-        self.context_vectors.append(embedding)
+        # Both vectors are unit-length, so cosine similarity is just their dot product
+        return float(np.dot(self.initial_prompt_embedding, response_embedding))
+
+    def add_to_context(self, query, response, response_embedding):
+        """Store query-response pair in the vector database, indexed by the response embedding
+        already computed for relevance gating (no second encode of the same response)."""
+        # The FAISS index is the only store of context vectors; use index.reconstruct(i) if one is needed
         self.context_data.append((query, response))
-        index.add(np.array([embedding], dtype='float32'))
+        self._pending_vectors.append(response_embedding)
+        if len(self._pending_vectors) >= INDEX_ADD_BATCH:
+            self.flush_context_vectors()
+
+    def flush_context_vectors(self):
+        """Add all buffered embeddings to the FAISS index in one call instead of one row per add."""
+        if self._pending_vectors:
+            self.index.add(np.ascontiguousarray(np.stack(self._pending_vectors), dtype=np.float32))
+            self._pending_vectors.clear()
+            if isinstance(self.index, faiss.IndexFlat) and self.index.ntotal >= INDEX_UPGRADE_THRESHOLD:
+                self._upgrade_index()
+
+    def _upgrade_index(self):
+        """Rebuild the flat index as HNSW (no training needed): O(log N) searches instead of O(N)."""
+        vectors = self.index.reconstruct_n(0, self.index.ntotal)
+        hnsw_index = faiss.IndexHNSWFlat(dimension, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        hnsw_index.add(vectors)  # Same insertion order, so row ids still match context_data
+        self.index = hnsw_index
+        logger.info(f"Upgraded context index to HNSW at {hnsw_index.ntotal} vectors")
 
     def search_context(self, query_embedding, k=3):
         """Retrieve top-k relevant context entries."""
-        distances, indices = index.search(np.array([query_embedding], dtype='float32'), k)
-        return [self.context_data[i] for i in indices[0] if i < len(self.context_data)]
+        self.flush_context_vectors()
+        np.copyto(self._query_buf[0], query_embedding)
+        distances, indices = self.index.search(self._query_buf, k)
+        # FAISS pads with -1 when fewer than k vectors exist
+        return [self.context_data[i] for i in indices[0] if 0 <= i < len(self.context_data)]
 
-    def explore_query(self, query, depth):
-        """Process a query and update context if relevant."""
-        if query in self.visited_queries or depth >= self.max_depth:
+    async def explore_query(self, query, depth, response=None, response_embedding=None):
+        """Process a query and update context if relevant. `response` and its embedding may be
+        pre-computed by the batched calls in deep_research."""
+        if self._query_key(query) in self.visited_queries or depth >= self.max_depth:
             return
         
-        response = self.generate_response(query)
+        if response is None:
+            response = await self.generate_response(query)
         logger.info(f"Response for query '{query}': {response}")
-        response_embedding = self.embed_text(response)
+        if response_embedding is None:
+            if self.is_obvious_reject(query, response):
+                return
+            response_embedding = await self.embed_text_async(response)
         relevance_score = self.evaluate_response(response_embedding)
         
         logger.info(f"Relevance score for '{query}': {relevance_score}")
 
         if relevance_score > self.relevance_threshold:
             
-            self.add_to_context(query, response)
-            self.visited_queries.add(query)
-            new_queries = self.generate_sub_queries(query, response)
-            for new_query in new_queries:
-                if new_query not in self.visited_queries:
-                    self.query_queue.append((new_query, depth + 1))
-
-    def synthesize_answer(self):
+            self.add_to_context(query, response, response_embedding)
+            self.visited_queries.add(self._query_key(query))
+            new_queries = await self.generate_sub_queries(query, response)
+            await self.enqueue_queries(new_queries, depth + 1)
+
+    async def synthesize_answer(self):
         """Synthesize a final answer from relevant context."""
         if not self.context_data:
             return "No relevant information gathered."
         
-        top_indices = index.search(np.array([self.initial_prompt_embedding], dtype='float32'), 5)[1][0]
-        top_context = [self.context_data[i] for i in top_indices if i < len(self.context_data)]
+        self.flush_context_vectors()
+        np.copyto(self._query_buf[0], self.initial_prompt_embedding)
+        top_indices = self.index.search(self._query_buf, 5)[1][0]
+        top_context = [self.context_data[i] for i in top_indices if 0 <= i < len(self.context_data)]
         context_text = "\n".join([f"Q: {q}\nA: {a}" for q, a in top_context])
         synthesis_prompt = f"Summarize this into a comprehensive Research answer:\n\n{context_text}"
-        return llm(synthesis_prompt).strip()
+        return (await self.stream_llm(synthesis_prompt)).strip()
 
-    def deep_research(self, initial_prompt):
+    async def deep_research(self, initial_prompt):
         """Execute the deep research process."""
-        self.initialize_exploration(initial_prompt)
+        await self.initialize_exploration(initial_prompt)
         while self.query_queue and len(self.visited_queries) < self.max_depth:
-            query, depth = self.query_queue.popleft()
-            logger.info(f"Exploring query: {query}, Depth: {depth}")
-            self.explore_query(query, depth)
-        return self.synthesize_answer()
+            # Drain a frontier of the best-scored queued queries and explore it concurrently, so the LLM round-trips overlap
+            frontier = [heapq.heappop(self.query_queue)[2:] for _ in range(min(FRONTIER_WIDTH, len(self.query_queue)))]
+            frontier = [(query, depth) for query, depth in frontier if self._query_key(query) not in self.visited_queries and depth < self.max_depth]
+            if not frontier:
+                continue
+            for query, depth in frontier:
+                logger.info(f"Exploring query: {query}, Depth: {depth}")
+            # One LLM call answers the whole frontier; the rest of each exploration still runs concurrently
+            responses = await self.generate_responses_batched([query for query, _ in frontier])
+            candidates = [
+                (query, depth, response) for (query, depth), response in zip(frontier, responses)
+                if not self.is_obvious_reject(query, response)
+            ]
+            if not candidates:
+                continue
+            # ...and one padded encode embeds all of the responses that survived the prefilter
+            response_embeddings = await self.embed_texts_async([response for _, _, response in candidates])
+            await asyncio.gather(*(
+                self.explore_query(query, depth, response, response_embedding)
+                for (query, depth, response), response_embedding in zip(candidates, response_embeddings)
+            ))
+            self.flush_context_vectors()  # One index.add per BFS level
+        return await self.synthesize_answer()
 
 # Usage
-simulator = DeepResearchSimulator()
-initial_prompt = "Explain about Bitcoin and how it revolutionises payment?"
-logger.info(f"STARTING DEEP RESEARCH FOR: {initial_prompt}")
-final_answer = simulator.deep_research(initial_prompt)
-print("Final Answer:\n", final_answer)
\ No newline at end of file
+if __name__ == "__main__":
+    configure_faiss_threads()
+    simulator = DeepResearchSimulator()
+    initial_prompt = "Explain about Bitcoin and how it revolutionises payment?"
+    logger.info(f"STARTING DEEP RESEARCH FOR: {initial_prompt}")
+    final_answer = asyncio.run(simulator.deep_research(initial_prompt))
+    print("Final Answer:\n", final_answer)
\ No newline at end of file
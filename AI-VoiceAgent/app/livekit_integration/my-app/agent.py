@@ -1,5 +1,9 @@
+import asyncio
+import functools
 import logging
 import os
+import re
+import time
 
 from dotenv import load_dotenv
 from livekit.agents import (
@@ -26,6 +30,13 @@ from livekit.plugins.turn_detector.multilingual import MultilingualModel
 from calendar_utils import CalendarManager
 from zapier_integration import zapier_integration
 
+try:
+    # libuv-based event loop for the socket-heavy STT/LLM/TTS/MCP traffic; set at import so job processes get it too
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    pass
+
 
 load_dotenv(dotenv_path=".env")
 logger = logging.getLogger("voice-agent")
@@ -41,18 +52,85 @@ logging.getLogger("voice-agent").setLevel(logging.INFO)
 logging.getLogger("livekit.agents").setLevel(logging.WARNING)  # Reduced verbosity
 logging.getLogger("livekit.plugins").setLevel(logging.WARNING)  # Reduced verbosity
 
+# Prompt token budget for the chat context; truncation kicks in at 90% to leave headroom for the reply
+CONTEXT_BUDGET_TOKENS = int(os.getenv("CONTEXT_BUDGET_TOKENS", "4000"))
+CONTEXT_BUDGET_HEADROOM = 0.9
+# Evicted turns are folded into a running summary instead of being lost; re-summarize once this many piled up
+SUMMARY_MIN_EVICTED = 4
+SUMMARY_MODEL = "llama-3.1-8b-instant"
+SUMMARY_ID_PREFIX = "summary_"  # Summary messages get ids with this prefix, so stale ones can be recognized
+
+
+# Built once at import; whitespace is normalized so no stray spaces/newlines are sent with every LLM request
+ASSISTANT_INSTRUCTIONS = " ".join("""
+    You are a helpful voice assistant with calendar management.
+    Use available tools to help users with calendar tasks.
+    Confirm the actions before executing them. Ask for questions if needed like if there is a create event request
+    and you see the input parameters have description or attendees, ask the user to confirm the details.
+    Don't hallucinate or make up information. Ask for clarification if the request is unclear.
+    Keep responses short and conversational, without special characters.
+    If tool results have 'success' false, explain the error clearly.
+""".split())
+
+
+class TokenEstimator:
+    """Counts tokens with tiktoken's cl100k_base when installed, else ~4 characters per token."""
+    _encoding = None
+    _loaded = False
+
+    @classmethod
+    def count(cls, text: str) -> int:
+        if not cls._loaded:
+            try:
+                import tiktoken
+                cls._encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception:
+                logger.warning("tiktoken unavailable, estimating tokens as len(text) // 4")
+            cls._loaded = True
+        if cls._encoding is None:
+            return len(text) // 4
+        return len(cls._encoding.encode(text))
+
+
+# Static part of each tool's error reply; handlers only add the error string
+_ERR_FETCH = {"success": False, "message": "Sorry, I couldn't fetch your calendar events right now. Please try again."}
+_ERR_CREATE = {"success": False, "message": "Sorry, I couldn't create the calendar event right now. Please try again."}
+_ERR_FREE_TIME = {"success": False, "message": "Sorry, I couldn't check your free time right now. Please try again."}
+_ERR_UPDATE = {"success": False, "message": "Sorry, I couldn't update the calendar event right now. Please try again."}
+_ERR_DELETE = {"success": False, "message": "Sorry, I couldn't delete the calendar event right now. Please try again."}
+_ERR_SUMMARY = {"success": False, "message": "Sorry, I couldn't get your calendar summary right now. Please try again."}
+_ERR_OVERVIEW = {"success": False, "message": "Sorry, I couldn't get your calendar overview right now. Please try again."}
+
+# Durations such as "30 minutes", "1.5 hrs" or "1h"; spelled-out forms fall back to _DURATION_WORDS (checked in order)
+_DURATION_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(minute|min|hour|hr|h)s?\b', re.I)
+_DURATION_WORDS = {"half hour": 30, "half an hour": 30, "two hours": 120, "an hour": 60}
+
+
+def _parse_duration_minutes(text: str, default: int = 60) -> int:
+    """Converts a spoken duration to minutes in one regex pass, defaulting to an hour."""
+    m = _DURATION_RE.search(text)
+    if m:
+        return round(float(m.group(1)) * (60 if 'h' in m.group(2).lower() else 1))
+    text = text.lower()
+    for words, minutes in _DURATION_WORDS.items():
+        if words in text:
+            return minutes
+    return default
+
+
+def _item_text(item) -> str:
+    """Text an LLM sees for a chat item: message text, tool call arguments or tool output."""
+    text = getattr(item, 'text_content', None)
+    if text is None:
+        text = getattr(item, 'output', None) or getattr(item, 'arguments', None) or ""
+    return text if isinstance(text, str) else str(text)
+
 
 class Assistant(Agent):
     def __init__(self) -> None:
         # Optimized assistant with minimal instructions to reduce token usage
         super().__init__(
-            instructions="You are a helpful voice assistant with calendar management. "
-            "Use available tools to help users with calendar tasks. "
-            "Confirm the actions before executing them. Ask for questions if needed like if there is a create event request and you see the input parameters have description or attendees, ask the user to confirm the details "
-            "Don't hallucinate or make up information. Ask for clarification if the request is unclear. "
-            "Keep responses short and conversational. "
-            "remove special characters while sending the response to user "
-            "If tool results have 'success' false, explain the error clearly.",
+            instructions=ASSISTANT_INSTRUCTIONS,
             stt=deepgram.STT(api_key=os.getenv('DEEPGRAM_API_KEY')),
             llm=openai.LLM.with_deepseek(
                 model="deepseek-chat",  # this is DeepSeek-V3
@@ -65,59 +143,180 @@ class Assistant(Agent):
         
         # Initialize calendar manager
         self.calendar_manager = CalendarManager()
+        # Phrases like "today" or "tomorrow at 3" repeat across turns and tools; the minute bucket in the
+        # key keeps relative phrases from going stale
+        self._cached_parse = functools.lru_cache(maxsize=256)(
+            lambda query, minute_bucket: self.calendar_manager.parse_natural_language_time(query)
+        )
+        # Token counts per chat item id, so each message is only tokenized once
+        self._item_tokens: dict = {}
+        # Summary memory tier: evicted items wait in _evicted_lines until summarized into _summary_message,
+        # which stays pinned right after the system prompt. The summary LLM is built on first use (_get_summary_llm)
+        self._summary_llm = None
+        self._summary_text = ""
+        self._summary_message = None
+        self._summary_count = 0  # Numbers the summary message ids
+        self._summary_pending = False  # New summary not yet placed into the chat context
+        self._evicted_lines: list = []
+        self._summary_task = None
 
     async def on_enter(self):
-        # Connect to Zapier integration
-        await zapier_integration.connect()
-        
         # Minimal greeting to reduce token usage
         self.session.generate_reply(
             instructions="Greet the user briefly and ask how you can help with their calendar.", 
             allow_interruptions=True
         )
 
-    def _truncate_chat_context(self, items: list, keep_last_n: int = 4) -> list:
-        """Truncate chat context to prevent token buildup on free tier"""
-        if len(items) <= keep_last_n:
-            return items
-            
-        # Keep system messages and last N items
-        system_items = [item for item in items if hasattr(item, 'role') and item.role == "system"]
-        recent_items = items[-keep_last_n:]
+        # Usually already connected: entrypoint starts the Zapier connection before the participant joins
+        await zapier_integration.ensure_connected()
+
+    def _item_token_count(self, item) -> int:
+        item_id = getattr(item, 'id', None)
+        if item_id is None:
+            return TokenEstimator.count(_item_text(item))
+        tokens = self._item_tokens.get(item_id)
+        if tokens is None:
+            tokens = self._item_tokens[item_id] = TokenEstimator.count(_item_text(item))
+        return tokens
+
+    def _truncate_chat_context(self, items: list, token_budget: int) -> list:
+        """Truncate chat context to prevent token buildup on free tier.
+        Keeps every system message plus the newest other items that fit in token_budget (at least one)."""
+        system_items = []
+        other_items = []
+        remaining = token_budget
+        # One getattr per attribute per item; function calls/outputs have no role, so attrgetter would raise
+        for item in items:
+            if self._is_summary(item):
+                continue  # The current summary is re-inserted by _with_summary; older ones are dropped
+            if getattr(item, 'role', None) == "system":
+                system_items.append(item)
+                remaining -= self._item_token_count(item)
+            else:
+                other_items.append(item)
+        
+        # Walk back from the newest item, evicting the oldest once the budget is spent
+        keep_from = len(other_items)
+        while keep_from > 0:
+            cost = self._item_token_count(other_items[keep_from - 1])
+            if remaining - cost < 0 and keep_from < len(other_items):
+                break
+            remaining -= cost
+            keep_from -= 1
+        for item in other_items[:keep_from]:
+            self._item_tokens.pop(getattr(item, 'id', None), None)
+            text = _item_text(item)
+            if text:
+                self._evicted_lines.append(f"{getattr(item, 'role', 'tool')}: {text}")
         
-        # Combine keeping system context
-        result = system_items + [item for item in recent_items if item not in system_items]
-        logger.info(f"Truncated context from {len(items)} to {len(result)} items")
+        result = system_items + other_items[keep_from:]
+        logger.info("Truncated context from %s to %s items", len(items), len(result))
         return result
 
+    def _parse_time(self, query: str):
+        """parse_natural_language_time, cached per minute"""
+        return self._cached_parse(query.strip(), int(time.time() // 60))
+
+    @staticmethod
+    def _is_summary(item) -> bool:
+        """True for any summary message, not just the current one, so replaced summaries get dropped."""
+        item_id = getattr(item, 'id', None)
+        return isinstance(item_id, str) and item_id.startswith(SUMMARY_ID_PREFIX)
+
+    def _with_summary(self, items: list) -> list:
+        """Places the current summary message right after the leading system message(s), replacing any earlier one."""
+        items = [item for item in items if not self._is_summary(item)]
+        if self._summary_message is None:
+            return items
+        insert_at = 0
+        while insert_at < len(items) and getattr(items[insert_at], 'role', None) == "system":
+            insert_at += 1
+        return items[:insert_at] + [self._summary_message] + items[insert_at:]
+
+    def _get_summary_llm(self):
+        """Summary LLM, created on first use; None (summary tier off) when GROQ_API_KEY isn't set."""
+        if self._summary_llm is None and os.getenv("GROQ_API_KEY"):
+            self._summary_llm = groq.LLM(model=SUMMARY_MODEL, temperature=0)
+        return self._summary_llm
+
+    async def _refresh_summary(self):
+        """Rolls evicted turns into the running summary using a small, fast model."""
+        lines, self._evicted_lines = self._evicted_lines, []
+        prompt = "Summarize the following conversation preserving user preferences and pending actions. Keep it under 100 words.\n\n"
+        if self._summary_text:
+            prompt += f"Summary so far: {self._summary_text}\n\n"
+        prompt += "\n".join(lines)
+        summary_ctx = ChatContext.empty()
+        summary_ctx.add_message(role="user", content=prompt)
+        try:
+            parts = []
+            async with self._get_summary_llm().chat(chat_ctx=summary_ctx) as stream:
+                async for chunk in stream:
+                    if chunk.delta and chunk.delta.content:
+                        parts.append(chunk.delta.content)
+        except Exception as e:
+            logger.error("Failed to summarize evicted context: %s", e)
+            self._evicted_lines = lines + self._evicted_lines  # Try again with the next batch
+            return
+        self._summary_text = "".join(parts).strip()
+        if self._summary_message is not None:
+            self._item_tokens.pop(self._summary_message.id, None)
+        self._summary_count += 1
+        self._summary_message = ChatMessage(
+            id=f"{SUMMARY_ID_PREFIX}{self._summary_count}",
+            role="system",
+            content=[f"Summary of the earlier conversation: {self._summary_text}"],
+        )
+        self._summary_pending = True
+        logger.info("Summarized %s evicted context items", len(lines))
+
     async def on_user_turn_completed(self, chat_ctx: ChatContext, new_message: ChatMessage) -> None:
         """Hook called after user completes their turn - manage context here"""
-        # Truncate context every few turns to prevent token buildup
-        if len(chat_ctx.items) > 6:
-            chat_ctx_copy = self.chat_ctx.copy()
-            truncated_items = self._truncate_chat_context(chat_ctx_copy.items, keep_last_n=4)
-            chat_ctx_copy.items = truncated_items
-            await self.update_chat_ctx(chat_ctx_copy)
+        # Truncate only when the context actually nears the token budget, not after a fixed message count
+        total_tokens = sum(self._item_token_count(item) for item in chat_ctx.items)
+        over_budget = total_tokens > CONTEXT_BUDGET_TOKENS * CONTEXT_BUDGET_HEADROOM
+        if over_budget or self._summary_pending:
+            # Build the new item list straight from the current context; no copy of the full history first
+            items = self.chat_ctx.items
+            if over_budget:
+                items = self._truncate_chat_context(items, int(CONTEXT_BUDGET_TOKENS * CONTEXT_BUDGET_HEADROOM))
+            self._summary_pending = False
+            await self.update_chat_ctx(ChatContext(self._with_summary(items)))
+
+        # Summarize in the background so the reply to this turn isn't delayed
+        if len(self._evicted_lines) >= SUMMARY_MIN_EVICTED and (self._summary_task is None or self._summary_task.done()):
+            if self._get_summary_llm() is None:
+                # No summary tier without a Groq key; evicted turns are just dropped as before
+                self._evicted_lines.clear()
+                return
+            self._summary_task = asyncio.create_task(self._refresh_summary())
 
     @function_tool
     async def get_calendar_events(self, query: str = "today"):
         """Get calendar events for a time period"""
         try:
-            logger.debug(f"🗓️ [TOOL] get_calendar_events called with query: {query}")
+            logger.debug("🗓️ [TOOL] get_calendar_events called with query: %s", query)
             
+            # Parse the time off the event loop while Zapier is queried, so the fallback doesn't add its cost afterwards
+            parse_task = asyncio.create_task(asyncio.to_thread(self._parse_time, query))
+
             # Try Zapier integration first
-            if zapier_integration.connected:
-                result = await zapier_integration.find_calendar_events(
-                    instructions=f"Find calendar events for {query}",
-                    end_time=query,
-                    start_time=query
+            if await zapier_integration.ensure_connected():
+                result, _ = await asyncio.gather(
+                    zapier_integration.find_calendar_events(
+                        instructions=f"Find calendar events for {query}",
+                        end_time=query,
+                        start_time=query
+                    ),
+                    parse_task,
+                    return_exceptions=True,
                 )
-                if result.get("success"):
-                    logger.debug(f"🗓️ [TOOL] Zapier result: {result}")
+                if isinstance(result, dict) and result.get("success"):
+                    logger.debug("🗓️ [TOOL] Zapier result: %s", result)
                     return result
             
-            # Fallback to mock response
-            parsed_time = self.calendar_manager.parse_natural_language_time(query)
+            # Fallback to mock response (re-raises a parse error into the handler below)
+            parsed_time = await parse_task
             
             result = {
                 "success": True,
@@ -129,17 +328,13 @@ class Assistant(Agent):
             if parsed_time:
                 result["parsed_time"] = parsed_time
                 
-            logger.debug(f"🗓️ [TOOL] get_calendar_events returning: {result}")
+            logger.debug("🗓️ [TOOL] get_calendar_events returning: %s", result)
             return result
                 
         except Exception as e:
-            logger.error(f"❌ [TOOL] get_calendar_events error: {e}")
-            error_result = {
-                "success": False,
-                "message": "Sorry, I couldn't fetch your calendar events right now. Please try again.",
-                "error": str(e)
-            }
-            logger.debug(f"🗓️ [TOOL] get_calendar_events error result: {error_result}")
+            logger.error("❌ [TOOL] get_calendar_events error: %s", e)
+            error_result = {**_ERR_FETCH, "error": str(e)}
+            logger.debug("🗓️ [TOOL] get_calendar_events error result: %s", error_result)
             return error_result
 
     @function_tool
@@ -147,10 +342,10 @@ class Assistant(Agent):
                                   description: str = "", attendees: str = ""):
         """Create a new calendar event"""
         try:
-            logger.info(f"Creating calendar event: {title} for {when} lasting {duration}")
+            logger.info("Creating calendar event: %s for %s lasting %s", title, when, duration)
             
             # Try Zapier integration first
-            if zapier_integration.connected:
+            if await zapier_integration.ensure_connected():
                 result = await zapier_integration.create_calendar_event(
                     instructions=f"Create a calendar event titled '{title}' for {when} lasting {duration}",
                     summary=title,
@@ -159,11 +354,14 @@ class Assistant(Agent):
                     attendees=attendees
                 )
                 if result.get("success"):
-                    logger.debug(f"🗓️ [TOOL] Zapier create result: {result}")
+                    logger.debug("🗓️ [TOOL] Zapier create result: %s", result)
+                    return result
+                if result.get("outcome_unknown"):
+                    # The event may exist on Zapier's side; a mock success could lead to a duplicate booking
                     return result
             
             # Fallback to mock response
-            start_time = self.calendar_manager.parse_natural_language_time(when)
+            start_time = self._parse_time(when)
             
             if not start_time:
                 return {
@@ -173,19 +371,12 @@ class Assistant(Agent):
                 }
             
             # Parse duration and create event
-            duration_minutes = 60  # default to 1 hour
-            if "30 minutes" in duration.lower() or "half hour" in duration.lower():
-                duration_minutes = 30
-            elif "2 hours" in duration.lower():
-                duration_minutes = 120
-            elif "15 minutes" in duration.lower():
-                duration_minutes = 15
+            duration_minutes = _parse_duration_minutes(duration)
             
             end_time = self.calendar_manager.calculate_end_time(start_time, duration_minutes)
             
-            attendee_list = []
-            if attendees:
-                attendee_list = [email.strip() for email in attendees.split(",")]
+            # Skip the blanks left by trailing or doubled commas
+            attendee_list = [email for email in (part.strip() for part in attendees.split(",")) if email] if attendees else []
             
             event_data = self.calendar_manager.create_event_data(
                 title, start_time, end_time, description, attendee_list
@@ -200,29 +391,19 @@ class Assistant(Agent):
             }
             
         except Exception as e:
-            logger.error(f"Error creating calendar event: {e}")
-            return {
-                "success": False,
-                "message": "Sorry, I couldn't create the calendar event right now. Please try again.",
-                "error": str(e)
-            }
+            logger.error("Error creating calendar event: %s", e)
+            return {**_ERR_CREATE, "error": str(e)}
 
     @function_tool
     async def check_free_time(self, when: str = "today", duration: str = "1 hour"):
         """Check for free time slots"""
         try:
-            logger.info(f"Checking free time for {when} with duration {duration}")
+            logger.info("Checking free time for %s with duration %s", when, duration)
             
             # Parse duration
-            duration_minutes = 60  # default
-            if "30 minutes" in duration.lower():
-                duration_minutes = 30
-            elif "2 hours" in duration.lower():
-                duration_minutes = 120
-            elif "15 minutes" in duration.lower():
-                duration_minutes = 15
+            duration_minutes = _parse_duration_minutes(duration)
             
-            parsed_time = self.calendar_manager.parse_natural_language_time(when)
+            parsed_time = self._parse_time(when)
             
             if parsed_time:
                 # Mock available slots for now
@@ -243,18 +424,14 @@ class Assistant(Agent):
                 }
                 
         except Exception as e:
-            logger.error(f"Error checking free time: {e}")
-            return {
-                "success": False,
-                "message": "Sorry, I couldn't check your free time right now. Please try again.",
-                "error": str(e)
-            }
+            logger.error("Error checking free time: %s", e)
+            return {**_ERR_FREE_TIME, "error": str(e)}
 
     @function_tool
     async def update_calendar_event(self, event_query: str, changes: str):
         """Update an existing calendar event"""
         try:
-            logger.info(f"Updating calendar event: {event_query} with changes: {changes}")
+            logger.info("Updating calendar event: %s with changes: %s", event_query, changes)
             
             return {
                 "success": True,
@@ -264,18 +441,14 @@ class Assistant(Agent):
             }
             
         except Exception as e:
-            logger.error(f"Error updating calendar event: {e}")
-            return {
-                "success": False,
-                "message": "Sorry, I couldn't update the calendar event right now. Please try again.",
-                "error": str(e)
-            }
+            logger.error("Error updating calendar event: %s", e)
+            return {**_ERR_UPDATE, "error": str(e)}
 
     @function_tool
     async def delete_calendar_event(self, event_query: str):
         """Delete a calendar event"""
         try:
-            logger.info(f"Deleting calendar event: {event_query}")
+            logger.info("Deleting calendar event: %s", event_query)
             
             return {
                 "success": True,
@@ -284,18 +457,14 @@ class Assistant(Agent):
             }
             
         except Exception as e:
-            logger.error(f"Error deleting calendar event: {e}")
-            return {
-                "success": False,
-                "message": "Sorry, I couldn't delete the calendar event right now. Please try again.",
-                "error": str(e)
-            }
+            logger.error("Error deleting calendar event: %s", e)
+            return {**_ERR_DELETE, "error": str(e)}
 
     @function_tool
     async def get_calendar_summary(self, period: str = "today"):
         """Get a summary of calendar events for a time period"""
         try:
-            logger.info(f"Getting calendar summary for: {period}")
+            logger.info("Getting calendar summary for: %s", period)
             
             return {
                 "success": True,
@@ -310,18 +479,14 @@ class Assistant(Agent):
             }
 
         except Exception as e:
-            logger.error(f"Error getting calendar summary: {e}")
-            return {
-                "success": False,
-                "message": "Sorry, I couldn't get your calendar summary right now. Please try again.",
-                "error": str(e)
-            }
+            logger.error("Error getting calendar summary: %s", e)
+            return {**_ERR_SUMMARY, "error": str(e)}
 
     @function_tool
     async def get_comprehensive_calendar_overview(self, when: str = "today", include_free_time: bool = True):
         """Get a quick calendar overview with events and availability"""
         try:
-            logger.info(f"Getting comprehensive calendar overview for: {when}")
+            logger.info("Getting comprehensive calendar overview for: %s", when)
             
             # Simple combined response instead of multi-step guidance
             return {
@@ -334,12 +499,8 @@ class Assistant(Agent):
             }
 
         except Exception as e:
-            logger.error(f"Error getting comprehensive calendar overview: {e}")
-            return {
-                "success": False,
-                "message": "Sorry, I couldn't get your calendar overview right now. Please try again.",
-                "error": str(e)
-            }
+            logger.error("Error getting comprehensive calendar overview: %s", e)
+            return {**_ERR_OVERVIEW, "error": str(e)}
 
 
 def prewarm(proc: JobProcess):
@@ -347,12 +508,16 @@ def prewarm(proc: JobProcess):
 
 
 async def entrypoint(ctx: JobContext):
-    logger.info(f"connecting to room {ctx.room.name}")
+    # Open the Zapier MCP session while the room connects and we wait for the participant, so it's
+    # ready by on_enter. (prewarm runs outside the job's event loop, which the session must live on.)
+    zapier_integration.start_connect()
+
+    logger.info("connecting to room %s", ctx.room.name)
     await ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY)
 
     # Wait for the first participant to connect
     participant = await ctx.wait_for_participant()
-    logger.info(f"starting voice assistant for participant {participant.identity}")
+    logger.info("starting voice assistant for participant %s", participant.identity)
 
     usage_collector = metrics.UsageCollector()
 
@@ -0,0 +1,77 @@
+"""
+Tests for the voice agent's duration parsing and summary memory tier.
+Run from my-app: python -m pytest test_agent.py
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("livekit.agents")
+from livekit.agents.llm import ChatMessage
+from agent import Assistant, _parse_duration_minutes
+
+
+@pytest.mark.parametrize("text, minutes", [
+    ("book it for 30 minutes", 30),
+    ("make it 2 hrs", 120),
+    ("1h meeting", 60),
+    ("1.5 hours with Sam", 90),
+    ("a 0.25 hour sync", 15),
+    ("2.75h", 165),
+    ("12.4 minutes", 12),
+    ("half an hour", 30),
+    ("lunch", 60),
+])
+def test_parse_duration_minutes(text, minutes):
+    assert _parse_duration_minutes(text) == minutes
+
+
+class FakeSummaryLLM:
+    """Summarizes by echoing the last line of the prompt (the newest evicted turn)."""
+
+    def chat(self, chat_ctx):
+        return FakeStream(chat_ctx.items[-1].text_content.splitlines()[-1])
+
+
+class FakeStream:
+    def __init__(self, text):
+        self._text = text
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def __aiter__(self):
+        yield SimpleNamespace(delta=SimpleNamespace(content=self._text))
+
+
+def _summary_only_assistant():
+    # Skips Agent.__init__, which builds the STT/LLM/TTS plugins and needs their API keys
+    assistant = Assistant.__new__(Assistant)
+    assistant._item_tokens = {}
+    assistant._summary_llm = FakeSummaryLLM()
+    assistant._summary_text = ""
+    assistant._summary_message = None
+    assistant._summary_count = 0
+    assistant._summary_pending = False
+    assistant._evicted_lines = []
+    return assistant
+
+
+def test_refreshed_summary_replaces_previous_one():
+    assistant = _summary_only_assistant()
+    items = [ChatMessage(role="system", content=["instructions"]), ChatMessage(role="user", content=["hello"])]
+    for turn in ("first", "second"):
+        assistant._evicted_lines = [f"user: {turn}"]
+        asyncio.run(assistant._refresh_summary())
+        # Same path as on_user_turn_completed: truncate, then place the current summary
+        items = assistant._with_summary(assistant._truncate_chat_context(items, 10_000))
+
+    summaries = [item for item in items if assistant._is_summary(item)]
+    assert len(summaries) == 1
+    assert summaries[0].text_content.endswith("user: second")
+    assert [item.role for item in items] == ["system", "system", "user"]
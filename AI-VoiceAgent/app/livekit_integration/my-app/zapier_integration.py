@@ -1,4 +1,5 @@
 import asyncio
+import importlib.util
 import json
 import logging
 from typing import Dict, Any, Optional
@@ -14,35 +15,96 @@ except ImportError:
     Client = None
     StreamableHttpTransport = None
 
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so the handlers below catch either
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
 logger = logging.getLogger(__name__)
 
+KEEPALIVE_INTERVAL = 30  # Seconds between pings that keep the pooled Zapier connection warm
+ZAPIER_TIMEOUT = float(os.getenv("ZAPIER_TIMEOUT", "3.0"))  # Cap on a read-only tool call so a slow Zapier can't stall the turn
+# Creating an event isn't idempotent: give it much longer, since a timed-out call may still create the event
+ZAPIER_CREATE_TIMEOUT = float(os.getenv("ZAPIER_CREATE_TIMEOUT", "20.0"))
+
+
+def _pooled_client_factory(headers=None, timeout=None, auth=None):
+    """httpx client for the MCP transport with keep-alive pooling, so tool calls skip the TCP/TLS setup"""
+    return httpx.AsyncClient(
+        headers=headers,
+        timeout=timeout,
+        auth=auth,
+        follow_redirects=True,
+        limits=httpx.Limits(max_keepalive_connections=8, max_connections=16, keepalive_expiry=60),
+        http2=importlib.util.find_spec("h2") is not None,  # httpx needs the h2 package for HTTP/2
+    )
+
+
 class ZapierCalendarIntegration:
     def __init__(self):
         self.client = None
         self.connected = False
+        self._keepalive_task = None
+        self._connect_task = None
         
+    def start_connect(self):
+        """Starts connecting in the background, once; a failed attempt is retried on the next call"""
+        if self._connect_task is None or (self._connect_task.done() and not self.connected):
+            self._connect_task = asyncio.create_task(self.connect())
+        return self._connect_task
+
+    async def ensure_connected(self) -> bool:
+        """Returns whether the MCP session is usable, joining an in-flight connect or reconnecting if needed"""
+        if self.connected:
+            return True
+        return await self.start_connect()
+
     async def connect(self):
         """Connect to Zapier MCP server"""
         if not Client or not StreamableHttpTransport:
             logger.error("fastmcp not available")
             return False
+        if self.client:
+            await self.disconnect()  # Drop a session that failed a tool call before reconnecting
             
         try:
             server_url = os.getenv("ZAPIER_MCP_SERVER_URL")
-            transport = StreamableHttpTransport(server_url)
+            if httpx:
+                transport = StreamableHttpTransport(server_url, httpx_client_factory=_pooled_client_factory)
+            else:
+                transport = StreamableHttpTransport(server_url)
             self.client = Client(transport=transport)
             
             await self.client.__aenter__()
             logger.info("Connected to Zapier MCP server")
             self.connected = True
+            self._keepalive_task = asyncio.create_task(self._keepalive())
             return True
         except Exception as e:
             logger.error(f"Failed to connect to Zapier MCP server: {e}")
             self.connected = False
             return False
     
+    async def _keepalive(self):
+        """Pings the server periodically so the pooled connection isn't dropped between tool calls"""
+        while self.connected and self.client:
+            await asyncio.sleep(KEEPALIVE_INTERVAL)
+            try:
+                await self.client.ping()
+            except Exception as e:
+                logger.warning(f"Zapier MCP keep-alive ping failed: {e}")
+
     async def disconnect(self):
         """Disconnect from Zapier MCP server"""
+        if self._keepalive_task:
+            self._keepalive_task.cancel()
+            self._keepalive_task = None
         if self.client:
             try:
                 await self.client.__aexit__(None, None, None)
@@ -63,18 +125,22 @@ class ZapierCalendarIntegration:
             }
         
         try:
-            result = await self.client.call_tool(
-                "google_calendar_find_event",
-                {
-                    "instructions": instructions,
-                    **kwargs
-                }
+            result = await asyncio.wait_for(
+                self.client.call_tool(
+                    "google_calendar_find_event",
+                    {
+                        "instructions": instructions,
+                        **kwargs
+                    }
+                ),
+                timeout=ZAPIER_TIMEOUT
             )
             
             if result and len(result) > 0:
-                if hasattr(result[0], 'text'):
+                text = getattr(result[0], 'text', None)
+                if text is not None:
                     try:
-                        json_result = json.loads(result[0].text)
+                        json_result = json_loads(text)
                         return {
                             "success": True,
                             "result": json_result,
@@ -83,7 +149,7 @@ class ZapierCalendarIntegration:
                     except json.JSONDecodeError:
                         return {
                             "success": True,
-                            "result": result[0].text,
+                            "result": text,
                             "message": "Retrieved calendar events"
                         }
                 else:
@@ -99,8 +165,17 @@ class ZapierCalendarIntegration:
                     "result": None
                 }
                 
+        except asyncio.TimeoutError:
+            # Only slow, not broken: keep the session and let the caller fall back
+            logger.warning(f"Zapier call timed out after {ZAPIER_TIMEOUT}s while finding calendar events")
+            return {
+                "success": False,
+                "message": "Calendar service slow, using local fallback",
+                "error": "timeout"
+            }
         except Exception as e:
             logger.error(f"Error finding calendar events: {e}")
+            self.connected = False  # Reconnect on the next ensure_connected()
             return {
                 "success": False,
                 "message": f"Error finding calendar events: {str(e)}",
@@ -117,18 +192,22 @@ class ZapierCalendarIntegration:
             }
         
         try:
-            result = await self.client.call_tool(
-                "google_calendar_create_detailed_event",
-                {
-                    "instructions": instructions,
-                    **kwargs
-                }
+            result = await asyncio.wait_for(
+                self.client.call_tool(
+                    "google_calendar_create_detailed_event",
+                    {
+                        "instructions": instructions,
+                        **kwargs
+                    }
+                ),
+                timeout=ZAPIER_CREATE_TIMEOUT
             )
             
             if result and len(result) > 0:
-                if hasattr(result[0], 'text'):
+                text = getattr(result[0], 'text', None)
+                if text is not None:
                     try:
-                        json_result = json.loads(result[0].text)
+                        json_result = json_loads(text)
                         return {
                             "success": True,
                             "result": json_result,
@@ -137,7 +216,7 @@ class ZapierCalendarIntegration:
                     except json.JSONDecodeError:
                         return {
                             "success": True,
-                            "result": result[0].text,
+                            "result": text,
                             "message": "Created calendar event"
                         }
                 else:
@@ -153,8 +232,19 @@ class ZapierCalendarIntegration:
                     "result": None
                 }
                 
+        except asyncio.TimeoutError:
+            # Only slow, not broken: keep the session. The event may still have been created, so the outcome
+            # is unknown and must not be reported as a success (or retried blindly)
+            logger.warning(f"Zapier call timed out after {ZAPIER_CREATE_TIMEOUT}s while creating calendar event")
+            return {
+                "success": False,
+                "message": "The calendar service didn't respond in time, so I'm not sure whether the event was created. Please check your calendar before trying again.",
+                "error": "timeout",
+                "outcome_unknown": True
+            }
         except Exception as e:
             logger.error(f"Error creating calendar event: {e}")
+            self.connected = False  # Reconnect on the next ensure_connected()
             return {
                 "success": False,
                 "message": f"Error creating calendar event: {str(e)}",
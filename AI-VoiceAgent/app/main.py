@@ -4,11 +4,19 @@ Main entry point for the Voice AI Backend MVP.
 
 import logging
 import asyncio
+import signal
 from app.core import config
 from app.agent.agno_processing_logic import AgnoAgent
 from app.livekit_integration.livekit_agent_worker import LiveKitAgentWorker
 from app.livekit_integration.voice_pipeline_orchestrator import VoicePipelineOrchestrator
 
+try:
+    # libuv-based event loop; the backend is almost entirely socket I/O
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    pass
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -42,9 +50,16 @@ async def main():
         # Start the worker
         await worker.start()
         
-        # Keep the application running
-        while True:
-            await asyncio.sleep(1)
+        # Keep the application running until SIGINT/SIGTERM, without waking the loop while idle
+        shutdown = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, shutdown.set)
+            except NotImplementedError:
+                pass  # Windows: Ctrl+C still raises KeyboardInterrupt below
+        await shutdown.wait()
+        logger.info("Received shutdown signal, shutting down")
             
     except KeyboardInterrupt:
         logger.info("Received interrupt signal, shutting down")
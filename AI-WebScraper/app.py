@@ -1,21 +1,107 @@
 import asyncio
+import contextlib
+import datetime
+import functools
+import importlib.util
 import os
 import logging
-from typing import List, Dict, Any, Optional
+import random
+import re
+from types import SimpleNamespace
+from typing import AsyncIterator, List, Dict, Any, Optional, Set
 import json
+try:
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so the handlers below catch either
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+from urllib.parse import parse_qs, parse_qsl, urlencode, urlparse, urlsplit, urlunsplit
+import aiofiles
+import aiohttp
+import httpx
+from bs4 import BeautifulSoup
 from ddgs import DDGS
-from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, LLMConfig, LLMExtractionStrategy
+from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, LLMConfig
+from crawl4ai.content_filter_strategy import PruningContentFilter
+from crawl4ai.markdown_generation_strategy import DefaultMarkdownGenerator
 from crawl4ai.processors.pdf import PDFCrawlerStrategy, PDFContentScrapingStrategy
 from rag_manager import RAGManager
-from groq import Groq
+from query_cache import QueryCache
+from llm_extraction_cache import CachedLLMExtractionStrategy
+from groq import AsyncGroq
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # --- Constants ---
 DEFAULT_NUM_RESULTS = 1
-MAX_CONCURRENT_FETCHES = 5
+MAX_CONCURRENT_FETCHES = int(os.getenv("MAX_CONCURRENT_FETCHES", "20"))  # across all hosts
+MAX_FETCHES_PER_HOST = int(os.getenv("MAX_FETCHES_PER_HOST", "3"))  # so one slow or strict host can't hog the pool
+RATE_LIMIT_RETRIES = 2  # re-crawls of a URL answered with HTTP 429
 REQUEST_TIMEOUT = 25  # seconds
+DDG_HTML_URL = "https://html.duckduckgo.com/html/"
+DDG_RESULTS_PER_PAGE = 10
+SEARCH_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+GROQ_EXTRACTION_MODEL = "groq/llama-3.1-8b-instant"
+# Optional local model for page extraction, e.g. "ollama/llama3.1:8b-instruct-q4_K_M"; Groq is used when unset or unreachable
+LOCAL_LLM_PROVIDER = os.getenv("LOCAL_LLM_PROVIDER")
+LOCAL_LLM_BASE_URL = os.getenv("LOCAL_LLM_BASE_URL", "http://localhost:11434")
+LOCAL_LLM_PROBE_TIMEOUT = 2  # seconds
+# Output token cap for LLM page extraction: about half the page's estimated tokens, within these bounds
+MIN_EXTRACTION_TOKENS = 512
+MAX_EXTRACTION_TOKENS = 12000
+CHARS_PER_TOKEN = 4
+# run_async_upsert answers once this many pages are extracted, or once the soft deadline passes with at least one;
+# the remaining pages finish in the background and are only stored in RAG
+ASYNC_ANSWER_MIN_RESULTS = 3
+ASYNC_CRAWL_SOFT_DEADLINE = 20  # seconds
+ANSWER_CACHE_TTL = 24 * 60 * 60  # seconds; web answers go stale, so cached ones expire after a day
+ANSWER_CACHE_MAX_ENTRIES = 2000  # per scope
+TRACKING_QUERY_PARAMS = {'fbclid', 'gclid', 'ref', 'ref_src'}  # plus every utm_* parameter
+# Server-rendered pages are fetched over plain HTTP; pages with less text than this, or mostly script, go to the browser
+STATIC_FETCH_TIMEOUT = 10  # seconds
+MIN_STATIC_TEXT_CHARS = 500
+MAX_SCRIPT_RATIO = 0.7
+# Pages whose pruned markdown is shorter than this, or mostly links, are re-extracted with the LLM
+MIN_FILTERED_MARKDOWN_CHARS = 500
+MAX_LINK_LINE_RATIO = 0.5
+MARKDOWN_LINK_RE = re.compile(r'\[[^\]]*\]\([^)]*\)')
+CLEAN_TEXT_IN_THREAD_CHARS = 200_000  # extracted text longer than this is cleaned off the event loop
+# URLs that point to a PDF: a .pdf path (optionally followed by a query/fragment) or a common PDF URL pattern
+PDF_URL_RE = re.compile(r'\.pdf(?:[?#]|\Z)|/pdf/|filetype=pdf|format=pdf', re.IGNORECASE)
+UNSAFE_FILENAME_CHARS_RE = re.compile(r'[^\w \-.]')  # replaced with '_' in saved markdown filenames
+
+def _clean_text(text: str) -> List[str]:
+    """Split text into paragraphs (runs of non-blank lines, each line stripped) in a single pass."""
+    paragraphs = []
+    current = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line:
+            current.append(line)
+        elif current:
+            paragraphs.append('\n'.join(current))
+            current = []
+    if current:
+        paragraphs.append('\n'.join(current))
+    return paragraphs
+
+def _canonical_url(url: str) -> str:
+    """URL with a lowercase scheme and host, no fragment and no tracking query parameters, for deduplication."""
+    parts = urlsplit(url.strip())
+    query = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_QUERY_PARAMS and not key.lower().startswith('utm_')
+    ]
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(query), ''))
+
+def _needs_llm_extraction(filtered_markdown: str) -> bool:
+    """Whether heuristically filtered page markdown is too thin or link-heavy (navigation, link lists) to use as is."""
+    if len(filtered_markdown) < MIN_FILTERED_MARKDOWN_CHARS:
+        return True
+    lines = [line for line in filtered_markdown.splitlines() if line.strip()]
+    link_lines = sum(1 for line in lines if MARKDOWN_LINK_RE.search(line))
+    return link_lines > MAX_LINK_LINE_RATIO * len(lines)
 
 class SearchAgent:
     def __init__(self, rag_db_path: str = "./chroma_db"):
@@ -27,6 +113,50 @@ class SearchAgent:
         # Initialize the RAG manager for storing and retrieving documents
         self.rag_manager = RAGManager(persist_directory=rag_db_path)
 
+        # Semantic caches: near-identical queries reuse earlier answers / RAG hits. Both share one
+        # memoized embedder, so a query is embedded once even when run() also calls search_rag().
+        embed_query = functools.lru_cache(maxsize=256)(self.rag_manager.embed_query)
+        self.answer_cache = QueryCache(
+            embed_query,
+            persist_path=os.path.join(rag_db_path, "query_cache.pkl"),
+            max_age_seconds=ANSWER_CACHE_TTL,
+            max_entries=ANSWER_CACHE_MAX_ENTRIES
+        )
+        # Not persisted; cleared whenever new documents are stored
+        self.rag_cache = QueryCache(embed_query)
+
+        # Crawl concurrency limits shared by every extraction: a global cap plus one semaphore per host
+        self._fetch_semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+        # Per-host semaphores only exist while a fetch for that host is waiting or running (see _fetch_slot)
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._host_users: Dict[str, int] = {}
+
+        # Shared aiohttp session for web search, created lazily (see _get_http_session)
+        self._http: Optional[aiohttp.ClientSession] = None
+
+        # Shared async Groq client for answers, so calls reuse pooled keep-alive connections and don't block
+        # the event loop; None without an API key (get_llm_response then returns None)
+        groq_api_key = os.getenv("GROQ_API_KEY")
+        self._groq: Optional[AsyncGroq] = None
+        if groq_api_key:
+            self._groq = AsyncGroq(
+                api_key=groq_api_key,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+                    http2=importlib.util.find_spec("h2") is not None  # httpx needs the h2 package for HTTP/2
+                )
+            )
+        else:
+            logger.warning("GROQ_API_KEY environment variable is not set; LLM answers are disabled")
+
+        # HTML and PDF crawlers (keyed by is_pdf), started on first use and kept warm across runs (see _get_crawler)
+        self._crawlers: Dict[bool, AsyncWebCrawler] = {}
+        self._crawler_locks = {False: asyncio.Lock(), True: asyncio.Lock()}
+
+        # Work that outlives the call that started it (late crawls, RAG storage); referenced here so it isn't
+        # garbage-collected mid-run, and cancelled by close() before the crawlers it uses shut down
+        self._background_tasks: Set[asyncio.Task] = set()
+
     async def get_llm_response(self, question: str, context: str, model: str = "llama-3.1-8b-instant") -> Optional[str]:
         """Get a response from the LLM based on the provided context and question.
         
@@ -39,11 +169,9 @@ class SearchAgent:
             The generated response or None if an error occurs
         """
         try:
-            if "GROQ_API_KEY" not in os.environ:
+            if self._groq is None:
                 logger.error("GROQ_API_KEY environment variable is not set")
                 return None
-                
-            client = Groq(api_key=os.environ["GROQ_API_KEY"])
             
             # Prepare a general-purpose system prompt
             system_prompt = """You are a helpful AI assistant that delivers clear, direct answers from real-time web sources. Your responses should be:
@@ -71,7 +199,7 @@ Remember: Give direct answers using the information you have. Skip any meta-comm
             """
             
             # Make the API call
-            completion = client.chat.completions.create(
+            completion = await self._groq.chat.completions.create(
                 messages=[
                     {
                         "role": "system",
@@ -109,34 +237,47 @@ Remember: Give direct answers using the information you have. Skip any meta-comm
             String containing search results processed through LLM, while handling storage asynchronously
         """
         logger.info(f"Starting optimized async search for query: {query}")
+
+        # Answers are phrased differently from run()'s, so they are cached in their own scope
+        cache_scope = f"async|n={num_results}"
+        # A semantic lookup embeds the query, so keep it off the event loop
+        cached_response = await asyncio.to_thread(self.answer_cache.get, query, cache_scope)
+        if cached_response is not None:
+            logger.info("Returning cached answer")
+            return cached_response
+
         try:
             # 1. Quick check in RAG DB first (with short timeout)
+            rag_results = None
             try:
-                async with asyncio.timeout(2.0):  # 2 second timeout for RAG search
+                async with asyncio.timeout(2.0):  # 2 second timeout for RAG search only, not the answer below
                     rag_results = await self.search_rag(
                         query=query,
                         question=query,
                         n_results=num_results,
                         filter_by_question=True
                     )
-                    if rag_results and len(rag_results) > 0:
-                        results_context = "\n\n".join([str(result) for result in rag_results])
-                        llm_response = await self.get_llm_response(query, results_context)
-                        if llm_response != 0:
-                            return llm_response
             except asyncio.TimeoutError:
                 logger.info("RAG DB check timed out, proceeding with web search")
-                pass
+                
+            if rag_results and len(rag_results) > 0:
+                results_context = "\n\n".join([str(result) for result in rag_results])
+                llm_response = await self.get_llm_response(query, results_context)
+                if llm_response != 0:
+                    if llm_response and llm_response != "0":
+                        self.answer_cache.put(query, llm_response, scope=cache_scope)
+                    return llm_response
             
             # 2. Perform web search
             search_results_list = await self._perform_duckduckgo_search_with_retry(query, num_results)
             if not search_results_list:
                 return "No results found."
                 
-            # 3. Process URLs in parallel with true concurrency
+            # 3. Process URLs in parallel, within the agent's global and per-host crawl limits
             async def process_url_optimized(crawler, config, url, result_item):
                 try:
-                    result = await crawler.arun(url=url, config=config)
+                    async with self._fetch_slot(url):
+                        result = await crawler.arun(url=url, config=config)
                     if not result.success:
                         return None
                     
@@ -155,7 +296,6 @@ Remember: Give direct answers using the information you have. Skip any meta-comm
                     return None
                     
             # Setup crawlers and process URLs
-            browser_config = BrowserConfig(headless=True)
             llm_config = LLMConfig(
                 provider="groq/llama-3.1-8b-instant",
                 api_token=os.getenv("GROQ_API_KEY"),
@@ -163,34 +303,51 @@ Remember: Give direct answers using the information you have. Skip any meta-comm
                 max_tokens=12000
             )
             
-            extraction_strategy = LLMExtractionStrategy(llm_config=llm_config)
+            extraction_strategy = CachedLLMExtractionStrategy(llm_config=llm_config)
             html_crawl_config = CrawlerRunConfig(extraction_strategy=extraction_strategy)
             
-            # Process all URLs concurrently
-            async with AsyncWebCrawler(config=browser_config) as crawler:
-                tasks = []
-                processed_urls = set()
-                
-                for result in search_results_list:
-                    url = result.get('link')
-                    if not url:
-                        continue
-                        
-                    # Skip already processed URLs
-                    if self.rag_manager.is_url_processed(url):
-                        logger.info(f"Skipping already processed URL: {url}")
+            # Process all URLs concurrently on the shared (warm) browser, so late pages can outlive this call
+            crawler = await self._get_crawler(is_pdf=False)
+            tasks = []
+            
+            for result in search_results_list:
+                url = result.get('link')
+                if not url:
+                    continue
+                    
+                # Skip already processed URLs
+                if self.rag_manager.is_url_processed(url):
+                    logger.info(f"Skipping already processed URL: {url}")
+                    continue
+                    
+                tasks.append(asyncio.create_task(process_url_optimized(crawler, html_crawl_config, url, result)))
+            
+            if not tasks:
+                logger.info("No new URLs to process after filtering")
+                return "No new content to process. All URLs have already been processed."
+            
+            # Take pages as they finish instead of waiting for the slowest one; one failing URL shouldn't cancel the others
+            results = []
+            pending = set(tasks)
+            deadline = asyncio.get_running_loop().time() + ASYNC_CRAWL_SOFT_DEADLINE
+            while pending and len(results) < ASYNC_ANSWER_MIN_RESULTS:
+                timeout = deadline - asyncio.get_running_loop().time() if results else None
+                if timeout is not None and timeout <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.cancelled():
                         continue
-                        
-                    task = process_url_optimized(crawler, html_crawl_config, url, result)
-                    tasks.append(task)
-                    processed_urls.add(url)
-                
-                if not tasks:
-                    logger.info("No new URLs to process after filtering")
-                    return "No new content to process. All URLs have already been processed."
-                
-                results = await asyncio.gather(*tasks)
-                results = [r for r in results if r]  # Filter out None results
+                    if task.exception() is not None:
+                        logger.warning(f"Error processing URL: {task.exception()}")
+                    elif task.result():
+                        results.append(task.result())
+            
+            if pending:
+                logger.info(f"Answering from {len(results)} pages; {len(pending)} still crawling will only be stored")
+                for task in pending:
+                    self._track_background_task(task)
+                self._track_background_task(asyncio.create_task(self._store_late_results(pending, query)))
                 
             if not results:
                 return "Could not extract content from any URLs."
@@ -231,17 +388,32 @@ If the information isn't in the articles, only mention what is supported by the
             llm_response = await self.get_llm_response(query, focused_prompt)
             
             # 5. Start async RAG storage without waiting
-            asyncio.create_task(self._async_store_in_rag(results, query))
+            self._track_background_task(asyncio.create_task(self._async_store_in_rag(results, query)))
             
             if llm_response == "0" or not llm_response:
                 return "Could not extract a clear answer from the content. Please try rephrasing your question."
                 
+            self.answer_cache.put(query, llm_response, scope=cache_scope)
             return llm_response
             
         except Exception as e:
             logger.error(f"Error in async search: {e}", exc_info=True)
             raise RuntimeError(f"Failed to execute async search: {e}")
 
+    async def _store_late_results(self, tasks: Set[asyncio.Task], question: str):
+        """Wait for crawls that finished after run_async_upsert answered and store their pages in RAG."""
+        results = []
+        for task in asyncio.as_completed(tasks):
+            try:
+                result = await task
+            except Exception as e:
+                logger.warning(f"Error processing URL: {e}")
+                continue
+            if result:
+                results.append(result)
+        if results:
+            await self._async_store_in_rag(results, question)
+
     async def _async_store_in_rag(self, results: List[Dict[str, Any]], question: str):
         """Asynchronously store results in RAG database without blocking the main flow."""
         storage_status = {
@@ -266,7 +438,8 @@ If the information isn't in the articles, only mention what is supported by the
                         title = result['title']
                         
                         # Store document and get chunk count
-                        chunk_count = await self.rag_manager.store_document(
+                        chunk_count = await asyncio.to_thread(
+                            self.rag_manager.store_document,
                             content=content,
                             url=url,
                             question=question,
@@ -294,6 +467,7 @@ If the information isn't in the articles, only mention what is supported by the
                     continue
             
             storage_status['completion_time'] = datetime.datetime.now().isoformat()
+            self.rag_cache.clear()  # Newly stored chunks can change search results
             await self._save_storage_status(storage_status, question)
             
             logger.info(
@@ -323,17 +497,20 @@ If the information isn't in the articles, only mention what is supported by the
             filename = f"storage_status_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
             filepath = os.path.join(status_dir, filename)
             
-            with open(filepath, 'w') as f:
-                json.dump({
-                    'question': question,
-                    'status': status,
-                    'summary': {
-                        'total_urls': status['total'],
-                        'successful_urls': status['successful'],
-                        'failed_urls': status['failed'],
-                        'total_time': self._get_time_diff(status['start_time'], status['completion_time'])
-                    }
-                }, f, indent=2)
+            payload = json.dumps({
+                'question': question,
+                'status': status,
+                'summary': {
+                    'total_urls': status['total'],
+                    'successful_urls': status['successful'],
+                    'failed_urls': status['failed'],
+                    'total_time': self._get_time_diff(status['start_time'], status['completion_time'])
+                }
+            }, separators=(',', ':'))
+            
+            # Write without blocking the event loop (crawls and Groq calls may still be in flight)
+            async with aiofiles.open(filepath, 'w') as f:
+                await f.write(payload)
                 
             logger.info(f"Storage status saved to {filepath}")
         except Exception as e:
@@ -389,6 +566,12 @@ If the information isn't in the articles, only mention what is supported by the
         """
         logger.info(f"Starting search for query: {query}")
 
+        cache_scope = f"n={num_results}"
+        cached_response = await asyncio.to_thread(self.answer_cache.get, query, cache_scope)
+        if cached_response is not None:
+            logger.info("Returning cached answer")
+            return cached_response
+
         try:
             # 1. First try to get results from the vector database
             logger.info("Searching vector database...")
@@ -405,7 +588,10 @@ If the information isn't in the articles, only mention what is supported by the
                 # Convert results to string and process with LLM
                 results_context = "\n\n".join([str(result) for result in rag_results])
                 llm_response = await self.get_llm_response(query, results_context)
-                if llm_response!=0 : return llm_response or f"Here's what I found:\n\n{results_context}"
+                if llm_response!=0 :
+                    if llm_response and llm_response != "0":
+                        self.answer_cache.put(query, llm_response, scope=cache_scope)
+                    return llm_response or f"Here's what I found:\n\n{results_context}"
 
             # 2. If no results from vector DB, perform web search
             logger.info("No relevant results in vector database, performing web search...")
@@ -414,22 +600,29 @@ If the information isn't in the articles, only mention what is supported by the
                 logger.warning(f"No search results found for query: {query}")
                 return "No results found in vector database or web search."
 
-            # 3. Extract content using crawl4AI with LLM strategy
-            processed_results = await self._extract_with_crawl4ai(search_results_list)
+            # 3. Extract content using crawl4AI with LLM strategy, storing each page in the
+            # vector database as soon as it is extracted instead of waiting for the slowest URL
+            processed_results = []
+            async for result in self._iter_extract_with_crawl4ai(search_results_list):
+                processed_results.append(await self._store_result_in_rag(result, query))
             
             if not processed_results:
                 logger.warning("No content could be extracted from search results")
                 return "No content could be extracted from search results."
                 
             logger.info(f"Successfully processed {len(processed_results)} out of {len(search_results_list)} search results.")
+            self.rag_cache.clear()  # Newly stored chunks can change search results
             
-            # 4. Store the new results in the vector database
-            stored_results = await self._store_results(processed_results, query)
+            # 4. Save the results and answer from the newly stored content
+            stored_results = await self._store_results(processed_results, query, store_in_rag=False)
             logger.info(f"Stored {len(stored_results)} new results in vector database.")
             
             # 5. Format the results using LLM for better clarity
             results_context = "\n\n".join([str(result) for result in stored_results])
             llm_response = await self.get_llm_response(query, results_context)
+            if llm_response and llm_response != "0":
+                # Only real answers are cached; the raw-context fallback would outlive a transient Groq failure
+                self.answer_cache.put(query, llm_response, scope=cache_scope)
             return llm_response or f"Here's what I found:\n\n{results_context}"
 
         except Exception as e:
@@ -456,12 +649,20 @@ If the information isn't in the articles, only mention what is supported by the
             List of relevant documents with metadata
         """
         try:
-            return self.rag_manager.search(
+            cache_scope = f"{question}|{n_results}|{filter_by_question}"
+            cached_results = await asyncio.to_thread(self.rag_cache.get, query, cache_scope)
+            if cached_results is not None:
+                return cached_results
+
+            results = self.rag_manager.search(
                 query=query,
                 question=question,
                 n_results=n_results,
                 filter_by_question=filter_by_question
             )
+            if results:
+                self.rag_cache.put(query, results, scope=cache_scope)
+            return results
         except Exception as e:
             logger.error(f"Error searching RAG database: {e}")
             return []
@@ -498,44 +699,135 @@ If the information isn't in the articles, only mention what is supported by the
             logger.error(f"Error during DuckDuckGo search: {e}", exc_info=True)
             raise RuntimeError(f"Failed to execute search via DuckDuckGo: {e}")
     
-    async def _perform_duckduckgo_search_with_retry(self, query: str, num_results: int, max_retries: int = 3, initial_delay: float = 2.0) -> List[Dict[str, Any]]:
-        """Performs DDG search with exponential backoff on rate limit errors.
+    async def _get_http_session(self) -> aiohttp.ClientSession:
+        """Shared HTTP session, created on first use, so search requests reuse pooled keep-alive connections."""
+        if self._http is None or self._http.closed:
+            self._http = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=20, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+                headers={'User-Agent': SEARCH_USER_AGENT}
+            )
+        return self._http
+
+    async def _get_crawler(self, is_pdf: bool) -> AsyncWebCrawler:
+        """Shared HTML (browser) or PDF crawler, started on first use so later runs skip the browser launch."""
+        crawler = self._crawlers.get(is_pdf)
+        if crawler is not None:
+            return crawler
+        async with self._crawler_locks[is_pdf]:
+            if is_pdf not in self._crawlers:
+                if is_pdf:
+                    # PDF crawler strategy with default settings
+                    crawler = AsyncWebCrawler(crawler_strategy=PDFCrawlerStrategy())
+                else:
+                    # Configure browser for crawling
+                    crawler = AsyncWebCrawler(config=BrowserConfig(
+                        headless=True
+                       # browser=["edge"],
+                        #browser_args=["--no-sandbox", "--disable-dev-shm-usage"]
+                    ))
+                await crawler.__aenter__()
+                self._crawlers[is_pdf] = crawler
+            return self._crawlers[is_pdf]
+
+    def _track_background_task(self, task: asyncio.Task):
+        """Keep a reference to task until it finishes, so it can't be garbage-collected or outlive close()."""
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def close(self):
+        """Cancel background work, save the answer cache, close the shared HTTP session and Groq client, and shut down the crawlers."""
+        background_tasks = list(self._background_tasks)
+        for task in background_tasks:
+            task.cancel()
+        # Wait for the cancellations, so no late crawl still uses a crawler when it shuts down below
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        # put() only saves every few seconds; write whatever is left
+        await asyncio.to_thread(self.answer_cache.flush)
+        if self._http is not None and not self._http.closed:
+            await self._http.close()
+        if self._groq is not None:
+            await self._groq.close()
+        crawlers, self._crawlers = list(self._crawlers.values()), {}
+        for crawler in crawlers:
+            try:
+                await crawler.__aexit__(None, None, None)
+            except Exception as e:
+                logger.warning(f"Error closing crawler: {e}")
+
+    @contextlib.asynccontextmanager
+    async def _fetch_slot(self, url: str, semaphore: Optional[asyncio.Semaphore] = None):
+        """Holds a slot for url's host, then a global one (semaphore, by default the agent's fetch semaphore).
+
+        The host slot is taken first, so fetches queued behind a busy host don't sit on global slots that
+        other hosts could use. A host's semaphore is dropped once no fetch for it is waiting or running.
+        """
+        host = urlparse(url).netloc
+        host_semaphore = self._host_semaphores.get(host)
+        if host_semaphore is None:
+            host_semaphore = self._host_semaphores[host] = asyncio.Semaphore(MAX_FETCHES_PER_HOST)
+        self._host_users[host] = self._host_users.get(host, 0) + 1
+        try:
+            async with host_semaphore, semaphore or self._fetch_semaphore:
+                yield
+        finally:
+            self._host_users[host] -= 1
+            if not self._host_users[host]:
+                del self._host_users[host], self._host_semaphores[host]
+
+    async def _fetch_duckduckgo_page(self, query: str, page: int) -> List[Dict[str, Any]]:
+        """Fetch and parse one page of DuckDuckGo's HTML results.
         
         Args:
             query: The search query string
-            num_results: Maximum number of results to return
-            max_retries: Maximum number of retry attempts
-            initial_delay: Initial delay between retries in seconds
+            page: 1-based result page
             
         Returns:
             List of search result dictionaries
         """
-        import random
+        session = await self._get_http_session()
+        form = {
+            'q': query,
+            'kl': 'us-en',  # US English
+            'kp': '-2',  # Safe search off
+            'df': 'y',  # Results from the last year
+        }
+        if page > 1:
+            form['s'] = str((page - 1) * DDG_RESULTS_PER_PAGE)
+        async with session.post(DDG_HTML_URL, data=form) as response:
+            if response.status != 200:
+                # DDG answers rate-limited clients with a non-200 (usually 202) challenge page
+                raise RuntimeError(f"DuckDuckGo Ratelimit: HTTP {response.status}")
+            html = await response.text()
+
+        soup = BeautifulSoup(html, 'lxml')
+        results = []
+        for item in soup.select('div.result:not(.result--ad)'):
+            link = item.select_one('a.result__a')
+            if not link or not link.get('href'):
+                continue
+            href = link['href']
+            if urlparse(href).path.endswith('/y.js'):
+                continue  # Sponsored result that slipped past the ad class (ad clicks go through y.js)
+            # Result links go through DDG's redirect (//duckduckgo.com/l/?uddg=<target>)
+            target = parse_qs(urlparse(href).query).get('uddg')
+            snippet = item.select_one('.result__snippet')
+            results.append({
+                'link': target[0] if target else href,
+                'title': link.get_text(' ', strip=True),
+                'snippet': snippet.get_text(' ', strip=True) if snippet else '',
+            })
+        return results
+
+    async def _with_search_retry(self, search, max_retries: int, initial_delay: float):
+        """Run a search coroutine factory with exponential backoff (plus jitter) on rate limit errors."""
         retries = 0
         delay = initial_delay
         
-        def sync_search(page: int):
-            with DDGS() as ddgs:
-                return [{
-                    'link': r.get('href'),
-                    'title': r.get('title'),
-                    'snippet': r.get('body'),
-                } for r in ddgs.text(query,region='us-en',  # US English 
-                    safesearch='off',  # Allow all results
-                    timelimit='y'#pull latest
-                    ,max_results=num_results, backend='google',page=page)]
-        
         while retries <= max_retries:
             try:
                 logger.info(f"Attempting DuckDuckGo search (Attempt {retries + 1}/{max_retries + 1})...")
-                # Run the synchronous function in a thread pool
-                results = await asyncio.to_thread(sync_search, page=1)
-                #results.extend(await asyncio.to_thread(sync_search, page=2))
-                #will check again if needed for page 3
-                #results.extend(await asyncio.to_thread(sync_search, page=3))
-                logger.info(f"Successfully retrieved {len(results)} results")
-                logger.info(f"results are {results}")
-                return results
+                return await search()
 
             # Catch the specific RuntimeError potentially indicating rate limit, or broader exceptions
             except Exception as e:
@@ -560,6 +852,54 @@ If the information isn't in the articles, only mention what is supported by the
         logger.error("Exhausted all retries for DuckDuckGo search.")
         raise RuntimeError("Exhausted all retries for DuckDuckGo search.")
 
+    async def _perform_duckduckgo_search_with_retry(self, query: str, num_results: int, max_retries: int = 3, initial_delay: float = 2.0, pages: int = 1) -> List[Dict[str, Any]]:
+        """Performs DDG search with exponential backoff on rate limit errors.
+        
+        Result pages are fetched concurrently over the shared aiohttp session, one attempt each: a non-200
+        is DDG's rate-limit challenge, which retrying only prolongs. Falls back to the ddgs library (with
+        backoff) if the HTML endpoint yields nothing (challenged, or e.g. changed markup).
+        
+        Args:
+            query: The search query string
+            num_results: Maximum number of results to return
+            max_retries: Maximum number of retry attempts for the ddgs fallback
+            initial_delay: Initial delay between ddgs retries in seconds
+            pages: Number of result pages to fetch
+            
+        Returns:
+            List of search result dictionaries
+        """
+        page_results = await asyncio.gather(
+            *(self._fetch_duckduckgo_page(query, page) for page in range(1, pages + 1)),
+            return_exceptions=True
+        )
+        results = []
+        for page_result in page_results:
+            if isinstance(page_result, Exception):
+                logger.warning(f"DuckDuckGo HTML search page failed: {page_result}")
+            else:
+                results.extend(page_result)
+        results = results[:num_results]
+
+        if not results:
+            def sync_search():
+                with DDGS() as ddgs:
+                    return [{
+                        'link': r.get('href'),
+                        'title': r.get('title'),
+                        'snippet': r.get('body'),
+                    } for r in ddgs.text(query,region='us-en',  # US English 
+                        safesearch='off',  # Allow all results
+                        timelimit='y'#pull latest
+                        ,max_results=num_results, backend='google',page=1)]
+
+            logger.info("No results from DuckDuckGo HTML search, falling back to ddgs")
+            results = await self._with_search_retry(lambda: asyncio.to_thread(sync_search), max_retries, initial_delay)
+
+        logger.info(f"Successfully retrieved {len(results)} results")
+        logger.info(f"results are {results}")
+        return results
+
     def _is_pdf_url(self, url: str) -> bool:
         """Determine if URL points to a PDF file.
         
@@ -569,21 +909,43 @@ If the information isn't in the articles, only mention what is supported by the
         Returns:
             True if URL appears to be a PDF, False otherwise
         """
-        url = url.lower()
-        # Check file extension
-        if url.endswith('.pdf'):
-            return True
-            
-        # Check for common PDF URL patterns
-        pdf_patterns = [
-            '/pdf/',
-            'filetype=pdf',
-            'format=pdf',
-            '.pdf?',
-            '.pdf#'
-        ]
+        # One case-insensitive pass instead of lowercasing the URL and scanning for each pattern
+        return PDF_URL_RE.search(url) is not None
+
+    async def _extraction_llm_config(self) -> LLMConfig:
+        """LLM configuration for page extraction: the local model when LOCAL_LLM_PROVIDER is set and its server
+        responds, otherwise Groq.
+        
+        Returns:
+            LLMConfig for the extraction strategy
+        """
+        if LOCAL_LLM_PROVIDER:
+            try:
+                session = await self._get_http_session()
+                async with session.get(
+                    LOCAL_LLM_BASE_URL, timeout=aiohttp.ClientTimeout(total=LOCAL_LLM_PROBE_TIMEOUT)
+                ) as response:
+                    if response.status < 500:
+                        return LLMConfig(
+                            provider=LOCAL_LLM_PROVIDER,
+                            base_url=LOCAL_LLM_BASE_URL,
+                            temperature=0.3,
+                            max_tokens=MAX_EXTRACTION_TOKENS
+                        )
+                    logger.warning(f"Local LLM server at {LOCAL_LLM_BASE_URL} returned {response.status}, using Groq")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"Local LLM server at {LOCAL_LLM_BASE_URL} is unreachable ({e}), using Groq")
         
-        return any(pattern in url for pattern in pdf_patterns)
+        groq_api_key = os.getenv("GROQ_API_KEY")
+        if not groq_api_key:
+            raise ValueError("GROQ_API_KEY environment variable is required for LLM extraction")
+            
+        return LLMConfig(
+            provider=GROQ_EXTRACTION_MODEL,
+            api_token=groq_api_key,
+            temperature=0.3,
+            max_tokens=MAX_EXTRACTION_TOKENS
+        )
 
     async def _extract_with_crawl4ai(self, search_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Extract content from URLs using crawl4AI with appropriate strategy based on URL type.
@@ -594,29 +956,24 @@ If the information isn't in the articles, only mention what is supported by the
         Returns:
             List of dictionaries with extracted content
         """
-        logger.info(f"Extracting content from {len(search_results)} URLs using crawl4AI")
-        
-        # Configure browser for crawling
-        browser_config = BrowserConfig(
-            headless=True
-           # browser=["edge"],
-            #browser_args=["--no-sandbox", "--disable-dev-shm-usage"]
-        )
+        return [result async for result in self._iter_extract_with_crawl4ai(search_results)]
+
+    async def _iter_extract_with_crawl4ai(self, search_results: List[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+        """Like _extract_with_crawl4ai, but yields each result as soon as its URL finishes.
         
-        # Create LLM configuration for GROQ with Llama 8B
-        groq_api_key = os.getenv("GROQ_API_KEY")
-        if not groq_api_key:
-            raise ValueError("GROQ_API_KEY environment variable is required for LLM extraction")
+        Args:
+            search_results: List of search result dictionaries containing URLs
             
-        llm_config = LLMConfig(
-            provider="groq/llama-3.1-8b-instant",
-            api_token=groq_api_key,
-            temperature=0.3,
-            max_tokens=12000
-        )
+        Yields:
+            Dictionaries with extracted content, in completion order
+        """
+        logger.info(f"Extracting content from {len(search_results)} URLs using crawl4AI")
+        
+        # Create LLM configuration (local model if configured and up, otherwise GROQ with Llama 8B)
+        llm_config = await self._extraction_llm_config()
         
         # Create LLM extraction strategy for regular HTML content
-        extraction_strategy = LLMExtractionStrategy(
+        extraction_strategy = CachedLLMExtractionStrategy(
             llm_config=llm_config,
             instruction="""Extract the main content of the page with high precision. 
             Focus on the primary article, key information, and relevant data. 
@@ -625,14 +982,14 @@ If the information isn't in the articles, only mention what is supported by the
             For code snippets, ensure they are properly formatted and complete."""
         )
         
-        # Create crawler configuration for regular HTML content
+        # Create crawler configuration for regular HTML content. The first pass only prunes boilerplate from
+        # the page markdown; extraction_strategy is applied afterwards to pages that pass leaves too noisy
         html_crawl_config = CrawlerRunConfig(
-            extraction_strategy=extraction_strategy,
+            markdown_generator=DefaultMarkdownGenerator(content_filter=PruningContentFilter()),
             wait_until="domcontentloaded"
         )
         
-        # Create PDF crawler strategy with default settings
-        pdf_crawler_strategy = PDFCrawlerStrategy()
+        # Create PDF scraping strategy with default settings
         pdf_scraping_strategy = PDFContentScrapingStrategy()
         
         # Create crawler configuration for PDFs
@@ -641,75 +998,148 @@ If the information isn't in the articles, only mention what is supported by the
         )
         
         # Process URLs concurrently
-        processed_results = []
-        semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+        semaphore = self._fetch_semaphore
         
-        # Separate PDF and HTML URLs
+        # Separate PDF and HTML URLs, crawling each page once even if it was returned several times
+        # (e.g. on two result pages, or with different tracking parameters)
         pdf_results = []
         html_results = []
+        seen_urls = set()
         
         for result in search_results:
             url = result.get('link')
             if not url:
                 continue
-                
-            if self._is_pdf_url(url):
-                pdf_results.append(result)
+            canonical_url = _canonical_url(url)
+            if canonical_url in seen_urls:
+                continue
+            seen_urls.add(canonical_url)
+            # Bucket in the same pass with the precompiled pattern (what _is_pdf_url matches)
+            (pdf_results if PDF_URL_RE.search(url) else html_results).append(result)
+        
+        async def start_crawler(crawl_config: CrawlerRunConfig, items: List[Dict[str, Any]],
+                                is_pdf: bool) -> List[asyncio.Task]:
+            # Start this crawler's URLs as soon as it is up, without waiting for the other crawler
+            crawler = await self._get_crawler(is_pdf)
+            return [
+                asyncio.create_task(self._process_url(
+                    crawler, crawl_config, semaphore, item['link'], item, is_pdf=is_pdf,
+                    llm_extraction=None if is_pdf else extraction_strategy
+                ))
+                for item in items
+            ]
+
+        # Get (or boot, on first use) the HTML and PDF crawlers concurrently, and only those that have URLs to fetch
+        starts = []
+        if html_results:
+            starts.append(start_crawler(html_crawl_config, html_results, False))
+        if pdf_results:
+            starts.append(start_crawler(pdf_crawl_config, pdf_results, True))
+
+        tasks = []
+        for started in await asyncio.gather(*starts, return_exceptions=True):
+            if isinstance(started, Exception):
+                logger.error(f"Failed to start crawler: {started}")
             else:
-                html_results.append(result)
+                tasks.extend(started)
+
+        # Hand results over as they complete, so callers can store them while slower URLs are still crawling
+        for next_result in asyncio.as_completed(tasks):
+            try:
+                result = await next_result
+            except Exception as e:
+                logger.warning(f"Error processing URL: {e}")
+                continue
+            if result:
+                # Store the raw content before any processing
+                result['raw_content'] = result.get('extracted_text', '')
+                yield result
+
+    async def _fetch_static_page(self, url: str, markdown_generator: DefaultMarkdownGenerator) -> Optional[SimpleNamespace]:
+        """Fetch a page over the pooled HTTP session and build its markdown without a browser.
         
-        # Process HTML URLs
-        async with AsyncWebCrawler(config=browser_config) as crawler:
-            tasks = []
-            for result_item in html_results:
-                url = result_item.get('link')
-                if url:
-                    task = self._process_url(crawler, html_crawl_config, semaphore, url, result_item, is_pdf=False)
-                    tasks.append(task)
-            
-            # Process PDF URLs with PDF strategy
-            async with AsyncWebCrawler(crawler_strategy=pdf_crawler_strategy) as pdf_crawler:
-                for result_item in pdf_results:
-                    url = result_item.get('link')
-                    if url:
-                        task = self._process_url(pdf_crawler, pdf_crawl_config, semaphore, url, result_item, is_pdf=True)
-                        tasks.append(task)
-                
-                # Gather all results
-                if tasks:
-                    results = await asyncio.gather(*tasks, return_exceptions=True)
-                    for result in results:
-                        if isinstance(result, Exception):
-                            logger.warning(f"Error processing URL: {result}")
-                        elif result:
-                            # Store the raw content before any processing
-                            result['raw_content'] = result.get('extracted_text', '')
-                            processed_results.append(result)
+        Args:
+            url: URL to fetch
+            markdown_generator: Markdown generator (with content filter) from the HTML crawl config
+            
+        Returns:
+            A crawl-result-like object with success, extracted_content and markdown, or None if the page
+            should be crawled with the browser instead
+        """
+        try:
+            session = await self._get_http_session()
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=STATIC_FETCH_TIMEOUT)) as response:
+                if response.status != 200 or 'html' not in response.headers.get('Content-Type', ''):
+                    return None
+                html = await response.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError, UnicodeDecodeError) as e:
+            logger.info(f"Plain HTTP fetch failed for {url} ({e}), using the browser")
+            return None
         
-        return processed_results
+        try:
+            markdown = await asyncio.to_thread(self._static_page_markdown, html, url, markdown_generator)
+        except Exception as e:
+            logger.warning(f"Error generating markdown for {url}: {e}")
+            return None
+        if markdown is None:
+            logger.info(f"{url} looks client-rendered, using the browser")
+            return None
+        return SimpleNamespace(success=True, extracted_content=None, markdown=markdown)
+
+    @staticmethod
+    def _static_page_markdown(html: str, url: str, markdown_generator: DefaultMarkdownGenerator) -> Optional[Any]:
+        """Markdown for server-rendered HTML, or None if the page looks like a JS shell (little text, mostly script)."""
+        soup = BeautifulSoup(html, 'lxml')
+        script_chars = sum(len(script.get_text()) for script in soup.find_all('script'))
+        for tag in soup(['script', 'style', 'noscript', 'template']):
+            tag.decompose()
+        text_chars = len(soup.get_text(' ', strip=True))
+        if text_chars < MIN_STATIC_TEXT_CHARS or script_chars > MAX_SCRIPT_RATIO * (script_chars + text_chars):
+            return None
+        return markdown_generator.generate_markdown(str(soup), base_url=url)
 
     async def _process_url(self, crawler: AsyncWebCrawler, crawl_config: CrawlerRunConfig, 
                          semaphore: asyncio.Semaphore, url: str, 
-                         search_result_item: Dict[str, Any], is_pdf: bool = False) -> Optional[Dict[str, Any]]:
+                         search_result_item: Dict[str, Any], is_pdf: bool = False,
+                         llm_extraction: Optional[CachedLLMExtractionStrategy] = None) -> Optional[Dict[str, Any]]:
         """Process a single URL with crawl4AI.
         
         Args:
             crawler: The AsyncWebCrawler instance
-            crawl_config: Crawler configuration with LLM extraction strategy
-            semaphore: Semaphore for limiting concurrency
+            crawl_config: Crawler configuration (with an extraction strategy or a markdown content filter)
+            semaphore: Semaphore for limiting overall concurrency (a per-host limit is applied on top)
             url: URL to process
             search_result_item: Original search result data
             is_pdf: Whether the URL is a PDF (default: False)
+            llm_extraction: LLM strategy applied to HTML pages whose filtered markdown is too noisy (default: None)
             
         Returns:
             Dictionary with extracted content or None if processing failed
         """
-        async with semaphore:
+        async with self._fetch_slot(url, semaphore):
             try:
                 logger.info(f"Processing URL: {url}")
                 
-                # Run the crawler
-                result = await crawler.arun(url=url, config=crawl_config)
+                # Try plain HTTP first for HTML pages; only JS-rendered (or unreachable) pages need the browser
+                result = None
+                markdown_generator = getattr(crawl_config, 'markdown_generator', None)
+                if not is_pdf and markdown_generator is not None:
+                    result = await self._fetch_static_page(url, markdown_generator)
+                
+                if result is None:
+                    # Run the crawler
+                    result = await crawler.arun(url=url, config=crawl_config)
+                    
+                    # Back off and retry when the host rate limits us; the host slot stays held meanwhile
+                    delay = 2.0
+                    for attempt in range(RATE_LIMIT_RETRIES):
+                        if getattr(result, 'status_code', None) != 429:
+                            break
+                        wait_time = delay + delay * random.uniform(0.1, 0.5)
+                        logger.warning(f"Rate limited by {url}, retrying in {wait_time:.2f} seconds...")
+                        await asyncio.sleep(wait_time)
+                        delay *= 2
+                        result = await crawler.arun(url=url, config=crawl_config)
                 
                 if not result.success:
                     error_msg = getattr(result, 'error_message', 'Unknown error')
@@ -737,10 +1167,15 @@ If the information isn't in the articles, only mention what is supported by the
                     else:
                         markdown_content = extracted_content
                         
-                    # Clean up the extracted text
-                    extracted_text = '\n'.join(line.strip() for line in extracted_content.split('\n') if line.strip())
+                    # Clean up the extracted text once, keeping the paragraphs so storage doesn't re-split it
+                    if len(extracted_content) > CLEAN_TEXT_IN_THREAD_CHARS:
+                        paragraphs = await asyncio.to_thread(_clean_text, extracted_content)
+                    else:
+                        paragraphs = _clean_text(extracted_content)
+                    extracted_text = '\n'.join(paragraphs)
                 else:
                     # For HTML, process as before
+                    paragraphs = None
                     extracted_content = result.extracted_content or ""
                     markdown_content = ""
                     
@@ -751,11 +1186,24 @@ If the information isn't in the articles, only mention what is supported by the
                         else:
                             markdown_content = str(result.markdown)
                     
+                    # Without an extraction strategy in the crawl config, use the pruned markdown when it looks
+                    # like real content and only send the page to the LLM otherwise
+                    if not extracted_content and markdown_content:
+                        filtered_markdown = getattr(result.markdown, 'fit_markdown', None) or ""
+                        if llm_extraction is not None and _needs_llm_extraction(filtered_markdown):
+                            logger.info(f"Filtered markdown for {url} looks noisy, extracting with LLM")
+                            # Extracted content is at most the page's size, so don't let short pages reserve 12k output tokens
+                            max_tokens = min(MAX_EXTRACTION_TOKENS, max(MIN_EXTRACTION_TOKENS, len(markdown_content) // CHARS_PER_TOKEN // 2))
+                            # Paragraph sections, like crawl4ai's default chunking; the strategy merges them up to its token threshold
+                            extracted_content = await llm_extraction.with_max_tokens(max_tokens).arun(url, markdown_content.split('\n\n'))
+                        else:
+                            extracted_content = filtered_markdown or markdown_content
+                    
                     # Process extracted content, handling both string and list content types
                     # If content is a string, try to parse as JSON
                     if isinstance(extracted_content, str):
                         try:
-                            content_data = json.loads(extracted_content)
+                            content_data = json_loads(extracted_content)
                             if isinstance(content_data, list):
                                 # Handle list of content blocks
                                 extracted_text = "\n\n".join(
@@ -782,7 +1230,8 @@ If the information isn't in the articles, only mention what is supported by the
                     'extracted_text': extracted_text,
                     'raw_snippet': search_result_item.get('snippet', ''),
                     'success': True,
-                    'markdown': markdown_content
+                    'markdown': markdown_content,
+                    'paragraphs': paragraphs
                 }
                 
             except Exception as e:
@@ -799,6 +1248,8 @@ If the information isn't in the articles, only mention what is supported by the
     async def _store_results_in_rag(self, results: List[Dict[str, Any]], question: str) -> List[Dict[str, Any]]:
         """Store search results in the RAG vector database with question-based indexing.
         
+        All results are chunked, embedded and upserted in a single batch.
+        
         Args:
             results: List of search result dictionaries to store
             question: The original search question/query
@@ -809,71 +1260,97 @@ If the information isn't in the articles, only mention what is supported by the
         if not results:
             return []
             
-        processed_results = []
-        
+        pending = []
         for result in results:
-            print(f"link is {result.get('link', '')} or url that is present is {result.get('url', '')}")
-            try:
-                url = result.get('url', '')
-                title = result.get('title', 'Untitled')
-                content = result.get('extracted_text', '')
-                
-                if not content: #few pdfs are stored as raw markdown as extracted_text is empty
-                    print(f"extracting markdown since extracted_text is empty")
-                    content=result.get('markdown', '')
+            document = self._rag_document(result, question)
+            if document is not None:
+                pending.append((result, document))
                 
-                if not content:
-                    result['storage_status'] = 'skipped_no_content'
-                    processed_results.append(result)
-                    logger.warning(f"Skipping storage for {url}: no content or URL")
-                    continue
-                    
-                # Convert content to list if it's a string
-                if isinstance(content, str):
-                    # For strings, split into paragraphs for better chunking
-                    content = [p.strip() for p in content.split('\n\n') if p.strip()]
-                
-                # Determine source type (PDF or web)
-                is_pdf = self._is_pdf_url(url)
-                source_type = 'pdf' if is_pdf else 'web'
-                
-                # Add question to result metadata
-                result_metadata = {
-                    'original_result': {k: v for k, v in result.items() 
-                                     if k not in ['extracted_text', 'content','markdown']},
-                    'search_question': question
-                }
-                
-                # Store in RAG database with question context
-                # Convert content to list if it's a single string
-                if isinstance(content, str):
-                    content = [content]
-                elif not isinstance(content, list):
-                    content = [str(content)]
-                print("=="*50)
-                #below has all extracted content
-                #print(f"content is {content}")
-                print("=="*50)
-                chunk_count = self.rag_manager.store_document(
-                    content=content,  # Pass as list to preserve chunking
-                    url=url,
-                    question=question,  # Pass the question for indexing
-                    title=title,
-                    source_type=source_type,
-                    metadata=None
+        if pending:
+            try:
+                chunk_counts = await asyncio.to_thread(
+                    self.rag_manager.store_documents_bulk,
+                    [document for _, document in pending]
                 )
-                
-                result['storage_status'] = 'success'
-                result['chunks_stored'] = chunk_count
-                result['question'] = question  # Store question in the result
-                
             except Exception as e:
-                logger.error(f"Error storing result in RAG database: {e}")
-                result['storage_status'] = f'error: {str(e)}'
+                logger.error(f"Error storing results in RAG database: {e}")
+                for result, _ in pending:
+                    result['storage_status'] = f'error: {str(e)}'
+            else:
+                for (result, _), chunk_count in zip(pending, chunk_counts):
+                    result['storage_status'] = 'success'
+                    result['chunks_stored'] = chunk_count
+                    result['question'] = question  # Store question in the result
+            
+        self.rag_cache.clear()  # Newly stored chunks can change search results
+        return results
+
+    async def _store_result_in_rag(self, result: Dict[str, Any], question: str) -> Dict[str, Any]:
+        """Store a single search result in the RAG vector database, off the event loop.
+        
+        Args:
+            result: Search result dictionary to store
+            question: The original search question/query
+            
+        Returns:
+            The result with its storage status
+        """
+        try:
+            document = self._rag_document(result, question)
+            if document is None:
+                return result
                 
-            processed_results.append(result)
+            chunk_count = await asyncio.to_thread(self.rag_manager.store_document, **document)
+            
+            result['storage_status'] = 'success'
+            result['chunks_stored'] = chunk_count
+            result['question'] = question  # Store question in the result
+            
+        except Exception as e:
+            logger.error(f"Error storing result in RAG database: {e}")
+            result['storage_status'] = f'error: {str(e)}'
+            
+        return result
+
+    def _rag_document(self, result: Dict[str, Any], question: str) -> Optional[Dict[str, Any]]:
+        """Build the RAGManager.store_document arguments for a search result.
+        
+        Args:
+            result: Search result dictionary to store
+            question: The original search question/query
+            
+        Returns:
+            The store_document keyword arguments, or None (marking the result as skipped) if it has no content
+        """
+        url = result.get('url', '')
+        title = result.get('title', 'Untitled')
+        content = result.get('paragraphs') or result.get('extracted_text', '')
+        
+        if not content: #few pdfs are stored as raw markdown as extracted_text is empty
+            content=result.get('markdown', '')
+        
+        if not content:
+            result['storage_status'] = 'skipped_no_content'
+            logger.warning(f"Skipping storage for {url}: no content or URL")
+            return None
             
-        return processed_results
+        # Convert content to a list of paragraphs for better chunking
+        if isinstance(content, str):
+            content = [p.strip() for p in content.split('\n\n') if p.strip()]
+        elif not isinstance(content, list):
+            content = [str(content)]
+        
+        # Determine source type (PDF or web)
+        source_type = 'pdf' if self._is_pdf_url(url) else 'web'
+        
+        return {
+            'content': content,  # Pass as list to preserve chunking
+            'url': url,
+            'question': question,  # Pass the question for indexing
+            'title': title,
+            'source_type': source_type,
+            'metadata': None
+        }
         
     async def run_batch_urls(self, urls: List[str], context: str) -> str:
         """Process a list of URLs directly, extracting their content and storing in the vector database.
@@ -927,47 +1404,64 @@ If the information isn't in the articles, only mention what is supported by the
             logger.error(f"Error processing URLs: {e}", exc_info=True)
             raise RuntimeError(f"Failed to process URLs: {e}")
 
-    async def _store_results(self, results: List[Dict[str, Any]], question: str) -> str:
+    async def _save_result_markdown(self, result: Dict[str, Any], output_dir: str):
+        """Write a result's extracted text to a markdown file named after its title, without blocking the event loop.
+        
+        Args:
+            result: Search result dictionary with 'title' and 'extracted_text'
+            output_dir: Directory to write the file to (must exist)
+        """
+        # Create a filename from the title (sanitized)
+        filename = UNSAFE_FILENAME_CHARS_RE.sub('_', result['title']).strip()
+        filename = f"{filename}.md" if not filename.endswith('.md') else filename
+        filepath = os.path.join(output_dir, filename)
+        
+        try:
+            async with aiofiles.open(filepath, 'w', encoding='utf-8') as f:
+                await f.write(
+                    f"# {result['title']}\n\n"
+                    f"**Source:** {result.get('link', 'N/A')}\n\n"
+                    "---\n\n"
+                    f"{result['extracted_text']}"
+                )
+            
+            result['saved_to'] = filepath
+            logger.info(f"Saved content to {filepath}")
+            
+        except Exception as e:
+            logger.error(f"Error saving file {filepath}: {e}")
+            result['save_error'] = str(e)
+
+    async def _store_results(self, results: List[Dict[str, Any]], question: str, store_in_rag: bool = True) -> str:
         """Process and return the search results with question-based indexing.
         
         Args:
             results: List of search result dictionaries to process
             question: The original search question/query
+            store_in_rag: Whether the results still need to be stored in RAG (False if already stored)
             
         Returns:
             The processed results list with question context
         """
-        # First store in RAG with question context
-        results = await self._store_results_in_rag(results, question)
-        
-        # Then store in the original format
-        # (keeping this for backward compatibility)
+        if not results:
+            logger.warning("No results to process")
+            return 'None'
+            
+        # Store in RAG with question context and, concurrently, in the original format
+        # (keeping the markdown files for backward compatibility)
         output_dir = "output"
         os.makedirs(output_dir, exist_ok=True)
         
-        for result in results:
-            if not result.get('title') or not result.get('extracted_text'):
-                continue
-                
-            # Create a filename from the title (sanitized)
-            filename = "".join(c if c.isalnum() or c in ' _-.' else '_' 
-                             for c in result['title']).strip()
-            filename = f"{filename}.md" if not filename.endswith('.md') else filename
-            filepath = os.path.join(output_dir, filename)
-            
-            try:
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    f.write(f"# {result['title']}\n\n")
-                    f.write(f"**Source:** {result.get('link', 'N/A')}\n\n")
-                    f.write("---\n\n")
-                    f.write(result['extracted_text'])
-                
-                result['saved_to'] = filepath
-                logger.info(f"Saved content to {filepath}")
-                
-            except Exception as e:
-                logger.error(f"Error saving file {filepath}: {e}")
-                result['save_error'] = str(e)
+        writes = asyncio.gather(*(
+            self._save_result_markdown(result, output_dir)
+            for result in results
+            if result.get('title') and result.get('extracted_text')
+        ))
+        if store_in_rag:
+            results = await self._store_results_in_rag(results, question)
+        await writes
+        logger.info(f"Processed {len(results)} search results")
+        
         search_results = await self.search_rag(
                             query=question,
                             question=question,
@@ -982,23 +1476,14 @@ If the information isn't in the articles, only mention what is supported by the
                 f"{result.get('text', 'No content')}"
                 for result in search_results
             )
-            print(f"combined context is {combined_context}")
 
             # Get LLM response
             llm_response = await self.get_llm_response(question, combined_context)
-            if llm_response:
-                result['llm_response'] = llm_response
-            else:
-                result['llm_response'] = combined_context   
-        if not results:
-            logger.warning("No results to process")
-            return 'None'
-            
-        logger.info(f"Processed {len(results)} search results")
-        # Return the first result's llm_response if available, otherwise return the first result
-        if results and 'llm_response' in results[0]:
+            results[0]['llm_response'] = llm_response or combined_context
             return results[0]['llm_response']
-        return results[0] if results else 'No results found'
+            
+        # Without RAG matches, return the first result itself
+        return results[0]
 
 
 async def main():
@@ -1084,9 +1569,17 @@ async def main():
     except Exception as e:
         print(f"Error processing URLs: {e}")
         return 1
+    finally:
+        await agent.close()
         
     return 0
 
 
 if __name__ == "__main__":
+    try:
+        # libuv-based event loop; searching, crawling, Groq and Chroma calls are all I/O-bound
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
     asyncio.run(main())
\ No newline at end of file
@@ -28,6 +28,11 @@ app.add_middleware(
 search_agent = SearchAgent()
 db_repo = DatabaseRepository()
 
+@app.on_event("shutdown")
+async def close_search_agent():
+    """Closes the search agent's pooled HTTP session."""
+    await search_agent.close()
+
 # --- Pydantic Models (for Request/Response validation) ---
 
 class UrlList(BaseModel):
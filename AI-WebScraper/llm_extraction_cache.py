@@ -0,0 +1,102 @@
+"""
+Content-addressed cache for crawl4ai LLM extraction.
+
+Pages whose content was already extracted (e.g. the same docs page returned for different queries)
+reuse the stored blocks instead of sending the page to the LLM again.
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from typing import Any, List, Optional
+
+from crawl4ai import LLMExtractionStrategy
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = "./llm_cache/extractions.db"
+MAX_HASHED_CONTENT = 1024 * 1024  # Characters of page content that go into the cache key
+
+
+class CachedLLMExtractionStrategy(LLMExtractionStrategy):
+    """LLMExtractionStrategy that caches extracted blocks by a hash of the page content, model and instruction."""
+
+    def __init__(self, *args, cache_path: str = DEFAULT_CACHE_PATH, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_path = cache_path
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        with sqlite3.connect(self.cache_path) as conn:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS extractions (
+                content_hash TEXT PRIMARY KEY,
+                url TEXT,
+                blocks TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """)
+            conn.commit()
+
+    def with_max_tokens(self, max_tokens: int) -> "CachedLLMExtractionStrategy":
+        """Copy of this strategy whose LLM config generates at most max_tokens (the original is left unchanged)."""
+        strategy = copy.copy(self)
+        strategy.llm_config = copy.copy(self.llm_config)
+        strategy.llm_config.max_tokens = max_tokens
+        return strategy
+
+    def _content_hash(self, sections: List[str]) -> str:
+        llm_config = getattr(self, 'llm_config', None)
+        key = "\0".join([
+            str(getattr(llm_config, 'provider', '')),
+            str(getattr(self, 'instruction', '') or ''),
+            "\0".join(sections)[:MAX_HASHED_CONTENT],
+        ])
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def _get_cached(self, content_hash: str) -> Optional[List[Any]]:
+        try:
+            with sqlite3.connect(self.cache_path) as conn:
+                row = conn.execute(
+                    "SELECT blocks FROM extractions WHERE content_hash = ?", (content_hash,)
+                ).fetchone()
+            return json.loads(row[0]) if row else None
+        except Exception as e:
+            logger.warning(f"Error reading LLM extraction cache: {e}")
+            return None
+
+    def _put_cached(self, content_hash: str, url: str, blocks: List[Any]):
+        if not blocks or any(isinstance(b, dict) and b.get('error') for b in blocks):
+            return  # Don't cache failed extractions
+        try:
+            with sqlite3.connect(self.cache_path) as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO extractions (content_hash, url, blocks) VALUES (?, ?, ?)",
+                    (content_hash, url, json.dumps(blocks))
+                )
+                conn.commit()
+        except Exception as e:
+            logger.warning(f"Error writing LLM extraction cache: {e}")
+
+    def run(self, url: str, sections: List[str], *args, **kwargs) -> List[Any]:
+        content_hash = self._content_hash(sections)
+        cached = self._get_cached(content_hash)
+        if cached is not None:
+            logger.info(f"Using cached LLM extraction for {url}")
+            return cached
+        blocks = super().run(url, sections, *args, **kwargs)
+        self._put_cached(content_hash, url, blocks)
+        return blocks
+
+    async def arun(self, url: str, sections: List[str], *args, **kwargs) -> List[Any]:
+        # SQLite calls block, so the cache is read and written off the event loop
+        content_hash = self._content_hash(sections)
+        cached = await asyncio.to_thread(self._get_cached, content_hash)
+        if cached is not None:
+            logger.info(f"Using cached LLM extraction for {url}")
+            return cached
+        blocks = await super().arun(url, sections, *args, **kwargs)
+        await asyncio.to_thread(self._put_cached, content_hash, url, blocks)
+        return blocks
@@ -0,0 +1,216 @@
+"""
+Semantic query cache for the SearchAgent.
+
+A cached result is reused when a query repeats exactly or when its embedding is nearly identical
+(cosine similarity above a threshold) to a query answered before, skipping the search/crawl/LLM round-trip.
+"""
+
+import bisect
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class _ScopeEntries:
+    """Cached rows for one scope: unit-norm query embeddings plus the result and creation time of each row."""
+
+    def __init__(self, dim: int):
+        self.embeddings = np.empty((16, dim), dtype=np.float32)
+        self.results = []
+        self.created = []
+
+    def add(self, embedding: np.ndarray, result: Any, created: float) -> int:
+        row = len(self.results)
+        if row == len(self.embeddings):
+            # Grow by doubling so appends stay amortized O(d)
+            self.embeddings = np.concatenate([self.embeddings, np.empty_like(self.embeddings)])
+        self.embeddings[row] = embedding
+        self.results.append(result)
+        self.created.append(created)
+        return row
+
+    def drop_oldest(self, count: int) -> "_ScopeEntries":
+        """Copy of these entries without the first count rows (rows are kept in insertion order)."""
+        kept = _ScopeEntries(self.embeddings.shape[1])
+        for row in range(count, len(self.results)):
+            kept.add(self.embeddings[row], self.results[row], self.created[row])
+        return kept
+
+    def nearest(self, query: np.ndarray) -> Tuple[int, float]:
+        """
+        Row with the highest cosine similarity to query (one matmul over all rows), or (-1, 0.0) if empty.
+        Scopes are bounded by max_entries, so an exact scan stays cheap and never misses a near-duplicate.
+        """
+        count = len(self.results)
+        if not count:
+            return -1, 0.0
+        similarities = self.embeddings[:count] @ query
+        row = int(np.argmax(similarities))
+        return row, float(similarities[row])
+
+
+class QueryCache:
+    """
+    Maps queries to results, matching either exactly or by embedding similarity.
+
+    Results are kept per scope (e.g. the other search parameters), so a query only matches cached
+    queries made with the same settings.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[str], Any],
+        threshold: float = 0.95,
+        persist_path: Optional[str] = None,
+        max_age_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        save_interval: float = 30.0
+    ):
+        """
+        Args:
+            embed_fn: Returns the embedding vector for a query string
+            threshold: Minimum cosine similarity for a semantic hit
+            persist_path: Pickle file the cache is loaded from and saved to (in-memory only if None)
+            max_age_seconds: Entries older than this are ignored and purged on put (never expire if None)
+            max_entries: Rows kept per scope; the oldest are dropped beyond this (unbounded if None)
+            save_interval: Minimum seconds between the saves put() triggers; call flush() on shutdown
+        """
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.persist_path = persist_path
+        self.max_age_seconds = max_age_seconds
+        self.max_entries = max_entries
+        self.save_interval = save_interval
+        self._entries: Dict[str, _ScopeEntries] = {}
+        self._exact: Dict[str, Tuple[str, int]] = {}  # sha256 of scope + normalized query -> (scope, row)
+        self._dirty = False  # Changes not yet written to persist_path
+        # get() runs in worker threads (its embedding would block the event loop), so guard the row state
+        self._lock = threading.RLock()
+        self._last_save = time.monotonic()
+        self._load()
+
+    @staticmethod
+    def _normalize(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    @staticmethod
+    def _exact_key(query: str, scope: str) -> str:
+        return hashlib.sha256(f"{scope}\0{query}".encode('utf-8')).hexdigest()
+
+    def _embed(self, query: str) -> np.ndarray:
+        vector = np.asarray(self.embed_fn(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _is_fresh(self, entries: _ScopeEntries, row: int) -> bool:
+        return self.max_age_seconds is None or time.time() - entries.created[row] <= self.max_age_seconds
+
+    def get(self, query: str, scope: str = "") -> Optional[Any]:
+        """Returns the cached result for query, or None on a miss. Safe to call from a worker thread."""
+        query = self._normalize(query)
+        with self._lock:
+            entries = self._entries.get(scope)
+            if entries is None:
+                return None
+            hit = self._exact.get(self._exact_key(query, scope))
+            if hit:
+                return entries.results[hit[1]] if self._is_fresh(entries, hit[1]) else None
+
+        embedding = self._embed(query)  # Outside the lock; this is the slow part
+        with self._lock:
+            entries = self._entries.get(scope)
+            if entries is None:
+                return None
+            row, similarity = entries.nearest(embedding)
+            if similarity < self.threshold:
+                return None
+            logger.info(f"Semantic cache hit for '{query}' (similarity {similarity:.3f})")
+            if not self._is_fresh(entries, row):
+                return None
+            return entries.results[row]
+
+    def put(self, query: str, result: Any, scope: str = ""):
+        """Caches result for query; persisted at most once per save_interval if a path was given."""
+        query = self._normalize(query)
+        embedding = self._embed(query)
+        with self._lock:
+            entries = self._entries.get(scope)
+            if entries is None:
+                entries = self._entries[scope] = _ScopeEntries(len(embedding))
+            row = entries.add(embedding, result, time.time())
+            self._exact[self._exact_key(query, scope)] = (scope, row)
+            self._purge(scope)
+
+        self._dirty = True
+        if time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+
+    def _purge(self, scope: str):
+        """
+        Drops expired rows and rows over max_entries from scope. Rows are compacted in batches (once a quarter
+        of them expired, or down to 3/4 of max_entries), so the rebuild cost is amortized across puts.
+        """
+        entries = self._entries[scope]
+        count = len(entries.results)
+        drop = 0
+        if self.max_age_seconds is not None:
+            # created is in insertion order, so the expired rows are a prefix
+            expired = bisect.bisect_left(entries.created, time.time() - self.max_age_seconds)
+            if expired >= max(1, count // 4):
+                drop = expired
+        if self.max_entries is not None and count - drop > self.max_entries:
+            drop = count - max(1, self.max_entries * 3 // 4)
+        if not drop:
+            return
+
+        self._entries[scope] = entries.drop_oldest(drop)
+        for key, (key_scope, row) in list(self._exact.items()):
+            if key_scope == scope:
+                if row < drop:
+                    del self._exact[key]
+                else:
+                    self._exact[key] = (scope, row - drop)
+
+    def clear(self):
+        """Drops every entry, e.g. after new documents make cached results stale."""
+        with self._lock:
+            self._entries.clear()
+            self._exact.clear()
+        self.save()
+
+    def flush(self):
+        """Saves changes that put() has not persisted yet."""
+        if self._dirty:
+            self.save()
+
+    def save(self):
+        if not self.persist_path:
+            return
+        self._dirty = False
+        self._last_save = time.monotonic()
+        try:
+            os.makedirs(os.path.dirname(self.persist_path) or ".", exist_ok=True)
+            with self._lock, open(self.persist_path, 'wb') as f:
+                pickle.dump({'entries': self._entries, 'exact': self._exact}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.error(f"Error saving query cache to {self.persist_path}: {e}")
+
+    def _load(self):
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, 'rb') as f:
+                state = pickle.load(f)
+            self._entries = state['entries']
+            self._exact = state['exact']
+            logger.info(f"Loaded query cache with {len(self._exact)} entries from {self.persist_path}")
+        except Exception as e:
+            logger.warning(f"Could not load query cache from {self.persist_path}: {e}")
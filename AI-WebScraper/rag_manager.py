@@ -70,6 +70,8 @@ class RAGManager:
         embedding_func = embedding_functions.SentenceTransformerEmbeddingFunction(
             model_name=self.embedding_model
         )
+        # Kept so queries can be embedded with the same model outside of Chroma (see embed_query)
+        self.embedding_func = embedding_func
         
         try:
             # Try to get the collection if it exists
@@ -392,85 +394,119 @@ class RAGManager:
         Returns:
             Number of chunks stored
         """
-        
-        
-        if not content:
-            logger.warning("No content or URL provided for storage")
-            return 0
-            
-            
-        # Clean and filter empty strings
-        #content = [str(c).strip() for c in content if str(c).strip()]
-        
-        if not content:
-            logger.warning(f"Empty content after processing for {url}")
-            return 0
-            
-        # Optimize chunks before further processing, commenting below for now as getting some error
-        optimized_chunks = self._optimize_chunks(content)
-        #optimized_chunks=content
-        # Prepare metadata
-        doc_metadata = metadata or {}
-        
-        # Generate a consistent keyword for the question
-        question_keyword = self._generate_question_keyword(question)
-        print(f"Question keyword Generated: {question_keyword}")
-        
-        doc_metadata.update({
+        return self.store_documents_bulk([{
+            'content': content,
             'url': url,
-            'title': title,
-            'source': source_type,
             'question': question,
-            'question_keyword': question_keyword,  # Add the generated keyword
-            'stored_at': datetime.now().isoformat()
-        })
+            'title': title,
+            'source_type': source_type,
+            'metadata': metadata
+        }])[0]
+
+    def store_documents_bulk(self, items: List[Dict[str, Any]]) -> List[int]:
+        """
+        Store several documents after chunking, embedding and upserting all their chunks in one batch.
         
-        # Prepare documents and metadata for storage
-        documents = []
-        metadatas = []
-        ids = []
+        Args:
+            items: Dictionaries holding the store_document arguments for each document
+                   (content, url, question and optionally title, source_type, metadata)
+            
+        Returns:
+            Number of chunks stored for each item, in order
+        """
+        question_keywords = {}  # question -> keyword, so the keyword is only generated once per question
+        rows = {}  # document id -> (chunk, metadata)
+        stored = {}  # url -> (doc_metadata, chunk count), for the URLs something was stored for
+        # A URL listed more than once is only chunked and embedded once, from its last occurrence
+        last_index = {item['url']: index for index, item in enumerate(items)}
         
-        for i, chunk in enumerate(optimized_chunks):
-            if not chunk:
+        for index, item in enumerate(items):
+            content = item['content']
+            url = item['url']
+            question = item['question']
+            
+            if last_index[url] != index:
+                continue
+            if not content:
+                logger.warning("No content or URL provided for storage")
                 continue
                 
-            doc_id = self._generate_document_id(url, i)
-            chunk_metadata = doc_metadata.copy()
-            
-            # Add chunk-specific metadata if needed
-            if i < len(optimized_chunks) - 1:
-                chunk_metadata['chunk_position'] = i
-                chunk_metadata['total_chunks'] = len(optimized_chunks)
-            
-            documents.append(chunk)
-            metadatas.append(chunk_metadata)
-            ids.append(doc_id)
+            # Optimize chunks before further processing
+            optimized_chunks = self._optimize_chunks(content)
+            
+            # Prepare metadata
+            doc_metadata = item.get('metadata') or {}
+            
+            # Generate a consistent keyword for the question
+            if question not in question_keywords:
+                question_keywords[question] = self._generate_question_keyword(question)
+                logger.debug(f"Question keyword Generated: {question_keywords[question]}")
+            
+            doc_metadata.update({
+                'url': url,
+                'title': item.get('title', ""),
+                'source': item.get('source_type', "web"),
+                'question': question,
+                'question_keyword': question_keywords[question],  # Add the generated keyword
+                'stored_at': datetime.now().isoformat()
+            })
+            
+            chunk_count = 0
+            for i, chunk in enumerate(optimized_chunks):
+                if not chunk:
+                    continue
+                    
+                chunk_metadata = doc_metadata.copy()
+                
+                # Add chunk-specific metadata if needed
+                if i < len(optimized_chunks) - 1:
+                    chunk_metadata['chunk_position'] = i
+                    chunk_metadata['total_chunks'] = len(optimized_chunks)
+                
+                rows[self._generate_document_id(url, i)] = (chunk, chunk_metadata)
+                chunk_count += 1
+                
+            if not chunk_count:
+                logger.warning(f"No valid chunks to store for {url}")
+                continue
+                
+            stored[url] = (doc_metadata, chunk_count)
             
-        if not documents:
-            logger.warning(f"No valid chunks to store for {url}")
-            return 0
+        if not rows:
+            return [0] * len(items)
             
-        # Store in ChromaDB
+        # Store in ChromaDB; the collection's embedding function encodes each batch in one call
+        ids = list(rows)
         try:
-            self.collection.upsert(
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
-            logger.info(f"Stored {len(documents)} chunks for {url}")
+            get_max_batch_size = getattr(self.client, 'get_max_batch_size', None)
+            batch_size = get_max_batch_size() if get_max_batch_size else len(ids)
+            for start in range(0, len(ids), batch_size):
+                batch_ids = ids[start:start + batch_size]
+                self.collection.upsert(
+                    documents=[rows[doc_id][0] for doc_id in batch_ids],
+                    metadatas=[rows[doc_id][1] for doc_id in batch_ids],
+                    ids=batch_ids
+                )
+        except Exception as e:
+            logger.error(f"Error storing {len(items)} documents: {e}")
+            if hasattr(e, 'details') and 'already exists' in str(e.details):
+                logger.info("Documents already exist in the collection")
+                return self._chunk_counts(items, stored)
+            return [0] * len(items)
+            
+        for url, (doc_metadata, chunk_count) in stored.items():
+            logger.info(f"Stored {chunk_count} chunks for {url}")
             
             # Mark URL as processed after successful storage
             self.mark_url_processed(url, doc_metadata)
             logger.info(f"Marked URL as processed: {url}")
-            
-            return len(documents)
-            
-        except Exception as e:
-            logger.error(f"Error storing document {url}: {e}")
-            if hasattr(e, 'details') and 'already exists' in str(e.details):
-                logger.info("Document already exists in the collection")
-                return len(documents)
-            return 0
+                
+        return self._chunk_counts(items, stored)
+
+    @staticmethod
+    def _chunk_counts(items: List[Dict[str, Any]], stored: Dict[str, Tuple[Dict[str, Any], int]]) -> List[int]:
+        """Chunks stored per item, in order; every occurrence of a repeated URL reports its stored chunks."""
+        return [stored[item['url']][1] if item['url'] in stored else 0 for item in items]
     
     def search(
         self,
@@ -584,6 +620,10 @@ class RAGManager:
             print(f"Error in LLM inference: {str(e)}")
             return None
 
+    def embed_query(self, text: str):
+        """Embed a single text with the collection's embedding model."""
+        return self.embedding_func([text])[0]
+
     def get_stats(self) -> Dict[str, Any]:
         """
         Get statistics about the vector database.